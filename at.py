@@ -1,14 +1,33 @@
+import asyncio
+import bisect
+import contextvars
+import functools
+import hashlib
+import hmac
+import html
+import itertools
+import json
 import logging
 import math
-from datetime import datetime, timedelta
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import FileResponse
-import requests
-import urllib3
-from bs4 import BeautifulSoup
-
-# Disable SSL warnings
-urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager, contextmanager
+from datetime import date, datetime, timedelta
+from typing import List, Optional
+from cachetools import TTLCache
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.encoders import ENCODERS_BY_TYPE
+from fastapi.responses import PlainTextResponse, StreamingResponse
+import httpx
+from pydantic import BaseModel
+from starlette.datastructures import Headers, MutableHeaders
 
 # Configure logging
 logging.basicConfig(
@@ -19,8 +38,22 @@ logging.basicConfig(
     ]
 )
 logger = logging.getLogger(__name__)
+# httpx logs every request at INFO; keep portal traffic out of the app log
+logging.getLogger("httpx").setLevel(logging.WARNING)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    reaper = asyncio.create_task(reap_sessions())
+    yield
+    reaper.cancel()
+    for session in list(user_sessions.values()) + user_sessions.drain_dropped():
+        await session['lnct'].aclose()
+    user_sessions.clear()
+    await close_portal_transport()
 
-app = FastAPI()
+
+app = FastAPI(lifespan=lifespan)
 from fastapi.middleware.cors import CORSMiddleware
 
 app.add_middleware(
@@ -31,48 +64,884 @@ app.add_middleware(
     allow_headers=["*"],
 )
 # Don't mount static files for Vercel
-user_sessions = {}
+
+# Per-user attendance snapshots. One dashboard load hits several endpoints
+# back to back, so a short TTL lets all of them share a single portal scrape.
+# Past that TTL a snapshot is stale: for SNAPSHOT_STALE_TTL more seconds it
+# is still served at once while a background task refreshes it.
+SNAPSHOT_CACHE_TTL = float(os.environ.get("SNAPSHOT_CACHE_TTL", "60"))
+SNAPSHOT_STALE_TTL = float(os.environ.get("SNAPSHOT_STALE_TTL", "600"))
+SNAPSHOT_CACHE_MAXSIZE = int(os.environ.get("SNAPSHOT_CACHE_MAXSIZE", "1024"))
+snapshot_cache = TTLCache(maxsize=SNAPSHOT_CACHE_MAXSIZE, ttl=SNAPSHOT_CACHE_TTL + SNAPSHOT_STALE_TTL)
+snapshot_cache_lock = threading.Lock()
+
+# Portal scrapes currently running, keyed by (username, credential digest).
+# Concurrent requests for the same student await the same task instead of
+# starting their own login and page fetches.
+inflight_scrapes = {}
+
+# Shared, bounded pool for the independent portal page fetches in
+# get_attendance(). Sized for all users together, not per request.
+PORTAL_FETCH_WORKERS = int(os.environ.get("PORTAL_FETCH_WORKERS", "16"))
+portal_executor = ThreadPoolExecutor(max_workers=PORTAL_FETCH_WORKERS, thread_name_prefix="portal-fetch")
+
+# ==============================
+# HTML PARSING
+# ==============================
+
+# With lxml installed, the attendance page (summary + the large datewise
+# grid) is read straight from an lxml tree, and the smaller pages use lxml as
+# BeautifulSoup's tree builder. Without it everything falls back to the
+# pure-Python html.parser. HTML_PARSER=html.parser forces the fallback.
+try:
+    import lxml.html
+    _DEFAULT_HTML_PARSER = 'lxml'
+except ImportError:
+    _DEFAULT_HTML_PARSER = 'html.parser'
+HTML_PARSER = os.environ.get("HTML_PARSER", _DEFAULT_HTML_PARSER)
+
+DATEWISE_TABLE_ID = 'ctl00_ctl00_ContentPlaceHolder1_cp2_Gridview1'
+ENROLLMENT_NO_ID = 'ctl00_ContentPlaceHolder1_txtUEnrollNo'
+SUMMARY_IDS = {
+    'total_classes': ['ctl00_ctl00_ContentPlaceHolder1_cp2_lbltotperiod111'],
+    'present': ['ctl00_ctl00_ContentPlaceHolder1_cp2_lbltotalp11'],
+    'absent': ['ctl00_ctl00_ContentPlaceHolder1_cp2_lbltotala11']
+}
+_ATTENDANCE_PAGE_IDS = {DATEWISE_TABLE_ID, *(i for ids in SUMMARY_IDS.values() for i in ids)}
+
+# Strainers limit the tree to the nodes each page's parser actually reads.
+# Everything outside them (menus, scripts, layout) is skipped while parsing.
+# They are built on first use, as bs4 is imported: with its charset
+# detectors it is a noticeable part of a cold start, and with lxml installed
+# the attendance page and the login form never need it.
+STRAINERS = {
+    'attendance_page': {'id': lambda v: v in _ATTENDANCE_PAGE_IDS},
+    'subject_page': {'name': 'table'},
+    'personal_details': {'id': ENROLLMENT_NO_ID},
+    'student_name': {'name': 'span'}
+}
+
+# The login form is read from its <input> tags alone, matched straight out of
+# the markup, so the ViewState-heavy page is never built into a tree.
+INPUT_TAG_RE = re.compile(r'<input\b((?:[^>"\']|"[^"]*"|\'[^\']*\')*)>', re.IGNORECASE)
+TAG_ATTR_RE = re.compile(r'([^\s=/>]+)(?:\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+)))?')
+
+
+@functools.cache
+def soup_strainer(kind):
+    from bs4 import SoupStrainer
+    return SoupStrainer(**STRAINERS[kind])
+
+
+def make_soup(content, parse_only=None):
+    """BeautifulSoup tree of `content`, limited to the STRAINERS entry named by `parse_only`."""
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(content, HTML_PARSER, parse_only=soup_strainer(parse_only) if parse_only else None)
+
+
+def decode_html(content):
+    """Decode page bytes the way BeautifulSoup would."""
+    if isinstance(content, str):
+        return content
+    if content.isascii():
+        # Reads the same in every ASCII-compatible charset; skips detection
+        return content.decode('ascii')
+    from bs4 import UnicodeDammit
+    return UnicodeDammit(content, is_html=True).unicode_markup
+
+
+def make_lxml_tree(content):
+    return lxml.html.fromstring(decode_html(content))
+
+
+def iter_input_tags(text):
+    """Attributes of every <input> tag in `text`, names lower-cased and values unescaped."""
+    for tag in INPUT_TAG_RE.finditer(text):
+        attrs = {}
+        for name, double, single, bare in TAG_ATTR_RE.findall(tag.group(1)):
+            attrs.setdefault(name.lower(), html.unescape(double or single or bare))
+        yield attrs
+
+
+# ==============================
+# PARSED RECORDS
+# ==============================
+
+# Date formats seen in the portal's datewise grid
+PORTAL_DATE_FORMATS = ("%d-%b-%Y", "%d/%m/%Y", "%d %b %Y", "%d-%m-%Y", "%d-%m-%y")
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_portal_date(date_str):
+    """Portal date string as a date, or None. Cached: every date repeats once per lecture."""
+    for fmt in PORTAL_DATE_FORMATS:
+        try:
+            return datetime.strptime(date_str, fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+class Record(Mapping):
+    """
+    Base for parsed portal rows. Slotted to keep cached snapshots small, but
+    read-only mappings like the dicts they replace (row['date'], row.get(...),
+    'date' in row, dict(row), {**row}), so responses keep the same JSON shape.
+    """
+    __slots__ = ()
+    fields = ()
+
+    def keys(self):
+        return self.fields
+
+    def __getitem__(self, key):
+        if key in self.fields:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self.fields)
+
+    def __len__(self):
+        return len(self.fields)
+
+    def __contains__(self, key):
+        return key in self.fields
+
+    def get(self, key, default=None):
+        return getattr(self, key) if key in self.fields else default
+
+    def __eq__(self, other):
+        if isinstance(other, Record):
+            return type(self) is type(other) and all(getattr(self, f) == getattr(other, f) for f in self.fields)
+        if isinstance(other, dict):
+            return dict(self) == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self)!r})"
+
+
+class DatewiseRow(Record):
+    """One Gridview1 row. Strings are interned and the date is parsed once into `day`."""
+    __slots__ = ('date', 'lecture', 'subject', 'status', 'day')
+    fields = ('date', 'lecture', 'subject', 'status')
+
+    def __init__(self, date, lecture, subject, status):
+        self.date = sys.intern(date)
+        self.lecture = sys.intern(lecture)
+        self.subject = sys.intern(subject)
+        self.status = sys.intern(status)
+        self.day = parse_portal_date(self.date)
+
+
+class SubjectRecord(Record):
+    """One row of the subject-wise attendance table."""
+    __slots__ = fields = ('name', 'total', 'present', 'absent', 'percentage')
+
+    def __init__(self, name, total, present, absent, percentage):
+        self.name = sys.intern(name)
+        self.total = total
+        self.present = present
+        self.absent = absent
+        self.percentage = percentage
+
+
+def json_default(obj):
+    """json.dumps hook for the parsed records."""
+    if isinstance(obj, Record):
+        return dict(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+# Let FastAPI's jsonable_encoder turn records straight into dicts. Without
+# this it falls back to dict(obj) after its other checks and then re-encodes
+# every field, which is slower than the plain dicts records replaced.
+ENCODERS_BY_TYPE[DatewiseRow] = ENCODERS_BY_TYPE[SubjectRecord] = dict
+
 
 # ==============================
-# SCRAPER CLASS (UNCHANGED)
+# INCREMENTAL DATEWISE STORE
 # ==============================
 
-class LNCTAttendance:
+class DatewiseStore:
+    """
+    Datewise rows already seen for one student, keyed by (date, lecture).
+
+    The portal re-sends the whole Gridview1 history on every fetch, but only
+    the newest rows change. The store remembers the raw markup of the rows it
+    has parsed, so a refresh only parses rows that were appended or prepended
+    and falls back to a full parse when anything else differs. Every change is
+    stamped with a version, letting clients fetch just the delta.
+    """
+
     def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-            'Connection': 'keep-alive'
-        })
-        self.base_url = "https://accsoft.lnctu.ac.in"
+        self.lock = threading.Lock()
+        self.rows = []
+        self.by_key = {}
+        self.row_versions = {}
+        # Versions are millisecond timestamps, so they keep increasing across
+        # restarts; a cursor from before this store existed forces a full sync.
+        self.created_version = self.version = int(time.time() * 1000)
+        self.removed_version = self.created_version
+        self.markup_len = 0
+        self.markup_hash = None
+
+    @staticmethod
+    def key(row):
+        return row.date, row.lecture
+
+    @staticmethod
+    def _hash(markup):
+        return hashlib.blake2b(markup.encode(), digest_size=16).digest()
+
+    def plan(self, markup):
+        """
+        Compare the current rows markup with what was parsed last time.
+        Returns (mode, fragment): mode is 'same', 'append', 'prepend' or
+        'full', and fragment is the markup that still needs parsing.
+        """
+        n = self.markup_len
+        if self.markup_hash is not None and len(markup) >= n:
+            if len(markup) == n and self._hash(markup) == self.markup_hash:
+                return 'same', ''
+            if self._hash(markup[:n]) == self.markup_hash:
+                return 'append', markup[n:]
+            if self._hash(markup[len(markup) - n:]) == self.markup_hash:
+                return 'prepend', markup[:len(markup) - n]
+        return 'full', markup
+
+    def merge(self, mode, new_rows, markup):
+        """Fold freshly parsed rows in. Returns a summary of what changed."""
+        if mode == 'same':
+            return {'mode': mode, 'version': self.version, 'added': 0, 'changed': 0, 'removed': 0}
+
+        version = max(self.version + 1, int(time.time() * 1000))
+        added = changed = removed = 0
+        by_key = self.by_key if mode != 'full' else {}
+        for row in new_rows:
+            key = self.key(row)
+            old = self.by_key.get(key)
+            if old is None:
+                added += 1
+            elif old != row:
+                changed += 1
+            else:
+                by_key[key] = old
+                continue
+            by_key[key] = row
+            self.row_versions[key] = version
+
+        if mode == 'append':
+            rows = self.rows + new_rows
+        elif mode == 'prepend':
+            rows = new_rows + self.rows
+        else:
+            rows = new_rows
+            gone = self.by_key.keys() - by_key.keys()
+            removed = len(gone)
+            for key in gone:
+                self.row_versions.pop(key, None)
+            if removed:
+                self.removed_version = version
+
+        self.rows = rows
+        self.by_key = by_key
+        self.markup_len = len(markup)
+        self.markup_hash = self._hash(markup)
+        if added or changed or removed:
+            self.version = version
+        return {'mode': mode, 'version': self.version, 'added': added, 'changed': changed, 'removed': removed}
+
+    def rows_since(self, since):
+        """Rows added or changed after `since`, or None if the caller needs a full resync."""
+        with self.lock:
+            if since < self.created_version or since < self.removed_version or since > self.version:
+                return None
+            return [row for row in self.rows if self.row_versions.get(self.key(row), 0) > since]
+
+
+# Stores outlive snapshots and sessions; a student's history only needs a
+# full parse again after they have been away for DATEWISE_STORE_TTL seconds.
+DATEWISE_STORE_TTL = float(os.environ.get("DATEWISE_STORE_TTL", str(6 * 3600)))
+datewise_stores = TTLCache(maxsize=SNAPSHOT_CACHE_MAXSIZE, ttl=DATEWISE_STORE_TTL)
+datewise_stores_lock = threading.Lock()
+
+
+def get_datewise_store(username, create=True):
+    with datewise_stores_lock:
+        store = datewise_stores.get(username)
+        if store is None and create:
+            store = DatewiseStore()
+        if store is not None:
+            # Re-insert to restart the TTL on every use
+            datewise_stores[username] = store
+        return store
+
+
+# ==============================
+# PORTAL TRANSPORT
+# ==============================
+
+# Connection pools shared by every student's scraper. Each scraper still has
+# its own cookie jar; only TCP/TLS connections are reused, so a new login
+# skips the handshake when a warm connection is available.
+PORTAL_CONNECT_TIMEOUT = float(os.environ.get("PORTAL_CONNECT_TIMEOUT", "5"))
+PORTAL_READ_TIMEOUT = float(os.environ.get("PORTAL_READ_TIMEOUT", "15"))
+PORTAL_MAX_CONNECTIONS = int(os.environ.get("PORTAL_MAX_CONNECTIONS", "200"))
+# httpcore assigns queued requests to connections with a scan over the whole
+# pool, which turns quadratic once a single pool holds hundreds of both. The
+# connection budget is therefore split over several small pools.
+PORTAL_POOL_SHARDS = int(os.environ.get("PORTAL_POOL_SHARDS", "16"))
+PORTAL_KEEPALIVE_EXPIRY = float(os.environ.get("PORTAL_KEEPALIVE_EXPIRY", "30"))
+# Retries apply to GETs only; the login POST is never replayed.
+PORTAL_GET_RETRIES = int(os.environ.get("PORTAL_GET_RETRIES", "2"))
+PORTAL_RETRY_BACKOFF = float(os.environ.get("PORTAL_RETRY_BACKOFF", "0.3"))
+PORTAL_RETRY_STATUSES = {502, 503, 504}
+
+PORTAL_TIMEOUT = httpx.Timeout(PORTAL_READ_TIMEOUT, connect=PORTAL_CONNECT_TIMEOUT)
+PORTAL_SYNC_TIMEOUT = (PORTAL_CONNECT_TIMEOUT, PORTAL_READ_TIMEOUT)
+
+_portal_transports = []
+_portal_transport_loop = None
+_portal_transport_turn = itertools.count()
+
+
+def get_portal_transport():
+    """
+    Hand out the shared async transports round-robin. They are tied to the
+    event loop they were created on, so a new loop (tests, benchmarks) gets
+    fresh pools.
+    """
+    global _portal_transports, _portal_transport_loop
+    loop = asyncio.get_running_loop()
+    if not _portal_transports or _portal_transport_loop is not loop:
+        per_shard = max(1, PORTAL_MAX_CONNECTIONS // PORTAL_POOL_SHARDS)
+        _portal_transports = [
+            httpx.AsyncHTTPTransport(
+                verify=False,
+                limits=httpx.Limits(
+                    max_connections=per_shard,
+                    max_keepalive_connections=per_shard,
+                    keepalive_expiry=PORTAL_KEEPALIVE_EXPIRY
+                )
+            )
+            for _ in range(PORTAL_POOL_SHARDS)
+        ]
+        _portal_transport_loop = loop
+    return _portal_transports[next(_portal_transport_turn) % len(_portal_transports)]
+
+
+async def close_portal_transport():
+    global _portal_transports
+    for transport in _portal_transports:
+        await transport.aclose()
+    _portal_transports = []
+
+
+@functools.cache
+def get_portal_http_adapter():
+    """
+    Shared requests adapter for the blocking scraper. HTTPAdapter is
+    thread-safe and can be mounted on many sessions. requests and urllib3
+    are only imported here: the API never needs them, and a serverless cold
+    start should not pay for them.
+    """
+    import requests
+    import urllib3
+    # The portal is reached with verify=False
+    urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    return requests.adapters.HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=PORTAL_MAX_CONNECTIONS,
+        max_retries=urllib3.util.Retry(
+            total=PORTAL_GET_RETRIES,
+            backoff_factor=PORTAL_RETRY_BACKOFF,
+            allowed_methods={'GET'},
+            status_forcelist=PORTAL_RETRY_STATUSES,
+            raise_on_status=False
+        )
+    )
+
+
+# ==============================
+# METRICS
+# ==============================
+
+# Latency histogram bucket upper bounds, in seconds
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+metrics_registry = []
+
+
+def _metric_labels(names, values, extra=()):
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape_label(v)}"' for k, v in pairs) + '}'
+
+
+def _escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class Counter:
+    """Monotonic counter, one value per label combination."""
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = {}
+        self.lock = threading.Lock()
+        metrics_registry.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def get(self, *labels):
+        return self.values.get(labels, 0)
+
+    def samples(self):
+        with self.lock:
+            values = list(self.values.items())
+        for labels, value in values:
+            yield self.name + _metric_labels(self.labels, labels), value
+
+
+class Gauge:
+    """Value read from `read()` whenever metrics are scraped."""
+    kind = 'gauge'
+
+    def __init__(self, name, help, read):
+        self.name = name
+        self.help = help
+        self.read = read
+        metrics_registry.append(self)
+
+    def samples(self):
+        yield self.name, self.read()
+
+
+class Histogram:
+    """
+    Latency histogram in seconds. `stage` names the entry the observations
+    add to the Server-Timing header of the request they happen in.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, help, stage, labels=(), buckets=METRICS_BUCKETS):
+        self.name = name
+        self.help = help
+        self.stage = stage
+        self.labels = labels
+        self.buckets = buckets
+        self.values = {}
+        self.lock = threading.Lock()
+        metrics_registry.append(self)
+
+    def observe(self, seconds, *labels):
+        with self.lock:
+            counts, total = self.values.get(labels) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[bisect.bisect_left(self.buckets, seconds)] += 1
+            self.values[labels] = counts, total + seconds
+        timings = server_timings.get()
+        if timings is not None:
+            timings.append((self.stage, '/'.join(labels), seconds))
+
+    @contextmanager
+    def time(self, *labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *labels)
+
+    def samples(self):
+        with self.lock:
+            values = [(labels, list(counts), total) for labels, (counts, total) in self.values.items()]
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                yield self.name + '_bucket' + _metric_labels(self.labels, labels, [('le', le)]), cumulative
+            yield self.name + '_sum' + _metric_labels(self.labels, labels), round(total, 6)
+            yield self.name + '_count' + _metric_labels(self.labels, labels), cumulative
+
+
+def count_portal_failure(stage, error):
+    (PORTAL_TIMEOUTS if isinstance(error, httpx.TimeoutException) else PORTAL_ERRORS).inc(stage)
+
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for metric in metrics_registry:
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        lines.extend(f'{name} {value}' for name, value in metric.samples())
+    return '\n'.join(lines) + '\n'
+
+
+def _session_hit_ratio():
+    hits = SESSION_LOOKUPS.get('memory') + SESSION_LOOKUPS.get('store')
+    total = hits + SESSION_LOOKUPS.get('miss')
+    return round(hits / total, 4) if total else 0
+
+
+REQUEST_SECONDS = Histogram('lnct_request_seconds', 'Time to the response headers, per route.', 'app', ('route',))
+LOGIN_SECONDS = Histogram('lnct_portal_login_seconds', 'Portal login: form fetch, parse and POST.', 'login')
+FETCH_SECONDS = Histogram('lnct_portal_fetch_seconds', 'Portal page fetch, retries included.', 'fetch', ('page',))
+PARSE_SECONDS = Histogram('lnct_parse_seconds', 'Parsing the fetched portal pages into a snapshot.', 'parse')
+ANALYSIS_SECONDS = Histogram('lnct_analysis_seconds', 'Building an endpoint\'s view from a snapshot.', 'analysis', ('endpoint',))
+PORTAL_ERRORS = Counter('lnct_portal_errors_total', 'Failed portal requests (transport errors and 5xx), per attempt.', ('stage',))
+PORTAL_TIMEOUTS = Counter('lnct_portal_timeouts_total', 'Portal requests that timed out, per attempt.', ('stage',))
+PORTAL_REJECTED = Counter('lnct_portal_rejected_total', 'Portal requests refused by the guard, by reason.', ('reason',))
+Gauge('lnct_portal_circuit_open', '1 while the portal circuit breaker refuses requests.', lambda: int(portal_guard.is_open()))
+SNAPSHOT_REQUESTS = Counter('lnct_snapshot_requests_total',
+                            'Snapshot lookups by outcome: cache, stale (served while refreshing), joined or scraped.',
+                            ('result',))
+LOGIN_FORMS = Counter('lnct_login_forms_total',
+                      'Logins by where the login form came from: cache or fetch; stale counts cached forms the portal rejected.',
+                      ('source',))
+SESSION_LOOKUPS = Counter('lnct_session_lookups_total', 'Portal session lookups: memory, store or miss (new login).', ('result',))
+Gauge('lnct_session_cache_hit_ratio', 'Share of session lookups that reused a logged-in session.', _session_hit_ratio)
+Gauge('lnct_active_sessions', 'Logged-in portal sessions held by this process.', lambda: len(user_sessions))
+
+# Stage timings of the request being handled, for its Server-Timing header.
+# Set per request by ServerTimingMiddleware; worker threads and tasks
+# started from the request inherit it.
+server_timings = contextvars.ContextVar('server_timings', default=None)
+
+
+def format_server_timing(timings):
+    return ', '.join(
+        f'{stage};desc="{desc}";dur={seconds * 1000:.1f}' if desc else f'{stage};dur={seconds * 1000:.1f}'
+        for stage, desc, seconds in timings
+    )
+
+
+class ServerTimingMiddleware:
+    """
+    Collect the stage timings recorded while handling a request, send them
+    as a Server-Timing header and record the request in REQUEST_SECONDS.
+    Stages that ran inside a scrape another request started are reported
+    on that request only.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        timings = []
+        token = server_timings.set(timings)
+        start = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message['type'] == 'http.response.start':
+                route = scope.get('route')
+                elapsed = time.perf_counter() - start
+                REQUEST_SECONDS.observe(elapsed, route.path if route is not None else 'unmatched')
+                MutableHeaders(raw=message['headers']).append('Server-Timing', format_server_timing(timings))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            server_timings.reset(token)
+
+
+app.add_middleware(ServerTimingMiddleware)
+
+
+# ==============================
+# PORTAL GUARD
+# ==============================
+
+# Every async portal request passes through one PortalGuard, so an outage
+# can't tie up the whole service: requests beyond the concurrency limit or
+# the rate wait at most PORTAL_QUEUE_TIMEOUT, and once the breaker is open
+# they are refused without touching the network.
+PORTAL_MAX_CONCURRENCY = int(os.environ.get("PORTAL_MAX_CONCURRENCY", str(PORTAL_MAX_CONNECTIONS)))
+PORTAL_RATE_LIMIT = float(os.environ.get("PORTAL_RATE_LIMIT", "200"))
+PORTAL_RATE_BURST = int(os.environ.get("PORTAL_RATE_BURST", "400"))
+PORTAL_QUEUE_TIMEOUT = float(os.environ.get("PORTAL_QUEUE_TIMEOUT", "5"))
+PORTAL_BREAKER_FAILURES = int(os.environ.get("PORTAL_BREAKER_FAILURES", "5"))
+PORTAL_BREAKER_COOLDOWN = float(os.environ.get("PORTAL_BREAKER_COOLDOWN", "30"))
+
+
+class PortalUnavailable(Exception):
+    """A portal request was refused by the PortalGuard, or the portal answered with a server error."""
+
+
+def check_portal_response(response):
+    """
+    Raise PortalUnavailable for a 5xx portal response. An outage page is
+    neither attendance data nor a rejected login, and must not be cached
+    or reported as bad credentials. Returns the response otherwise.
+    """
+    if response.status_code >= 500:
+        raise PortalUnavailable(f"Portal answered {response.status_code}, try again later")
+    return response
+
+
+# The batch (see PortalGuard.batch) the current task's portal requests belong
+# to: a one-item list holding the breaker opening whose trial it was admitted
+# as. Tasks gathered inside a batch share the list.
+_guard_batch = contextvars.ContextVar('portal_guard_batch', default=None)
+
+
+class PortalGuard:
+    """
+    Concurrency limit, token-bucket rate limit and circuit breaker for
+    portal requests. The breaker opens after `failures` consecutive failed
+    requests (transport errors, timeouts, 5xx); after `cooldown` seconds one
+    trial request is let through, and its outcome closes or re-opens it.
+    Requests started together under batch() (the pages of one scrape) go
+    through with the trial when one of them is it. Only used from the event
+    loop, so no locking is needed.
+    """
+
+    def __init__(self, concurrency=PORTAL_MAX_CONCURRENCY, rate=PORTAL_RATE_LIMIT, burst=PORTAL_RATE_BURST,
+                 queue_timeout=PORTAL_QUEUE_TIMEOUT, failures=PORTAL_BREAKER_FAILURES,
+                 cooldown=PORTAL_BREAKER_COOLDOWN):
+        self.concurrency = concurrency
+        self.rate = rate
+        self.burst = burst
+        self.queue_timeout = queue_timeout
+        self.failure_threshold = failures
+        self.cooldown = cooldown
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        self._semaphore = None
+        self._loop = None
+
+    @property
+    def semaphore(self):
+        # Like the transports, the semaphore belongs to one event loop
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._loop = loop
+        return self._semaphore
+
+    def is_open(self):
+        """True while requests are refused: cooling down, or a trial request is running."""
+        return self.opened_at is not None and (self.trial or time.monotonic() - self.opened_at < self.cooldown)
+
+    def retry_after(self):
+        if self.opened_at is None:
+            return 1
+        return max(1, math.ceil(self.cooldown - (time.monotonic() - self.opened_at)))
+
+    def _admit(self):
+        """Refuse while open; returns True if this request is the half-open trial."""
+        if self.opened_at is None:
+            return False
+        batch = _guard_batch.get()
+        if batch is not None and batch[0] == self.opened_at:
+            # A sibling of the trial, admitted with it until the breaker re-opens
+            return False
+        if self.is_open():
+            PORTAL_REJECTED.inc('circuit_open')
+            raise PortalUnavailable("Portal is unavailable, try again later")
+        self.trial = True
+        if batch is not None:
+            batch[0] = self.opened_at
+        return True
+
+    @contextmanager
+    def batch(self):
+        """
+        Group the requests started inside, e.g. the pages of one scrape fetched
+        concurrently, so that a half-open trial among them lets the others
+        through instead of failing the scrape on its siblings.
+        """
+        token = _guard_batch.set([None])
+        try:
+            yield
+        finally:
+            _guard_batch.reset(token)
+
+    async def _throttle(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        # Take a token now, even one that only refills later, and wait for it
+        self.tokens -= 1
+        if self.tokens < 0:
+            wait = -self.tokens / self.rate
+            if wait > self.queue_timeout:
+                self.tokens += 1
+                PORTAL_REJECTED.inc('rate_limit')
+                raise PortalUnavailable("Too many portal requests, try again later")
+            await asyncio.sleep(wait)
+
+    def _record(self, ok):
+        if ok:
+            if self.opened_at is not None:
+                logger.info("Portal circuit closed")
+            self.failures = 0
+            self.opened_at = None
+            return
+        self.failures += 1
+        if self.opened_at is not None or self.failures >= self.failure_threshold:
+            if self.opened_at is None:
+                logger.warning(f"Portal circuit opened after {self.failures} consecutive failures")
+            self.opened_at = time.monotonic()
+
+    async def send(self, method, *args, **kwargs):
+        """Await method(*args, **kwargs), an httpx request, under the guard."""
+        trial = self._admit()
+        try:
+            await self._throttle()
+            try:
+                await asyncio.wait_for(self.semaphore.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                PORTAL_REJECTED.inc('queue_full')
+                raise PortalUnavailable("Too many portal requests, try again later")
+            try:
+                r = await method(*args, **kwargs)
+            except httpx.TransportError:
+                self._record(False)
+                raise
+            finally:
+                self.semaphore.release()
+            self._record(r.status_code < 500)
+            return r
+        finally:
+            if trial:
+                self.trial = False
+
+
+portal_guard = PortalGuard()
+
+
+# ==============================
+# SCRAPER CLASSES
+# ==============================
+
+# LNCT_PORTAL_URL points the scrapers at another deployment, e.g. bench/mock_portal.py
+PORTAL_BASE_URL = os.environ.get("LNCT_PORTAL_URL", "https://accsoft.lnctu.ac.in").rstrip("/")
+PORTAL_HEADERS = {
+    'User-Agent': 'Mozilla/5.0',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+    'Connection': 'keep-alive'
+}
+
+# Sections of an attendance snapshot and the portal page each is read from.
+# Scrapers fetch and parse only the pages the requested sections need.
+SECTION_PAGES = {
+    'summary': 'attendance_page',
+    'datewise': 'attendance_page',
+    'subjects': 'subject_page',
+    'personal_details': 'personal_details_page'
+}
+ALL_SECTIONS = frozenset(SECTION_PAGES)
+
+# Candidate names of the login form's credential fields, in order of preference
+LOGIN_USER_FIELDS = ('ctl00$cph1$txtStuUser', 'txtUserName', 'UserId')
+LOGIN_PASSWORD_FIELDS = ('ctl00$cph1$txtStuPsw', 'txtPassword', 'Password')
+# The message a login page shows after rejecting the credentials it was sent
+LOGIN_REJECTED_RE = re.compile(r'(?:invalid|incorrect|wrong)\s+(?:user\s*(?:name|id)?|password|credentials|login)', re.I)
+
+# Login forms by login URL, one per portal deployment. With a cached form a
+# login posts straight away, reusing its ViewState, instead of fetching and
+# parsing studentLogin.aspx first. A login on a cached form that fails
+# without the portal's invalid-credentials message (an error page for an
+# expired ViewState, the form re-rendered, changed fields) drops the cached
+# form and is retried once on a freshly fetched one; when that succeeds the
+# cached form was stale and is replaced. A failure showing the message is
+# not retried, so a mistyped password costs the student one failed attempt
+# at the portal, not two. After LOGIN_FORM_MAX_STRIKES stale forms in a row
+# the deployment evidently rejects reused ViewStates, and logins fetch the
+# form every time until the cached one expires.
+LOGIN_FORM_TTL = float(os.environ.get("LOGIN_FORM_TTL", "3600"))
+LOGIN_FORM_MAX_STRIKES = 2
+login_forms = TTLCache(maxsize=16, ttl=LOGIN_FORM_TTL)
+
+
+class LoginForm:
+    """Field names of a login form and the hidden values (ViewState included) posted with them."""
+    __slots__ = ('user_field', 'password_field', 'fields', 'submit', 'strikes')
+
+    def __init__(self, user_field, password_field, fields, submit=None):
+        self.user_field = user_field
+        self.password_field = password_field
+        self.fields = fields
+        self.submit = submit
+        # Consecutive times this deployment rejected a reused form
+        self.strikes = 0
+
+    def fill(self, username, password):
+        """The POST body logging in as `username`."""
+        data = dict(self.fields)
+        data[self.user_field] = username
+        data[self.password_field] = password
+        if self.submit:
+            data[self.submit[0]] = self.submit[1]
+        return data
+
+
+
+class PortalParser:
+    """
+    Network-free parsing shared by the sync and async scrapers. Everything
+    here works on page bytes or on response objects exposing url/text/content,
+    so requests and httpx responses are interchangeable.
+    """
+
+    def __init__(self, base_url=PORTAL_BASE_URL):
+        self.base_url = base_url
         self.login_url = f"{self.base_url}/Accsoft2/studentLogin.aspx"
         self.attendance_url = f"{self.base_url}/AccSoft2/Parents/StuAttendanceStatus.aspx"
-        self.session.verify = False
+        self.subject_url = f"{self.base_url}/AccSoft2/parents/subwiseattn.aspx"
+        self.personal_details_url = f"{self.base_url}/AccSoft2/Parents/StudentPersonalDetails.aspx"
 
     def _is_valid_form_input(self, inp):
         name = inp.get('name')
         if not name: return False
         type_ = inp.get('type')
-        return type_ == 'hidden' or (type_ == 'radio' and inp.get('checked'))
+        return type_ == 'hidden' or (type_ == 'radio' and 'checked' in inp)
+
+    def parse_login_form(self, content):
+        """The LoginForm on a login page, or None if the credential fields are missing."""
+        inputs = list(iter_input_tags(decode_html(content)))
+        names = {inp.get('name') for inp in inputs}
+        u_field = next((f for f in LOGIN_USER_FIELDS if f in names), None)
+        p_field = next((f for f in LOGIN_PASSWORD_FIELDS if f in names), None)
+        if not (u_field and p_field):
+            return None
 
-    def get_form_data(self, soup):
-        return {
-            inp.get('name'): inp.get('value', '')
-            for inp in soup.find_all('input')
-            if self._is_valid_form_input(inp)
-        }
+        fields = {inp['name']: inp.get('value', '') for inp in inputs if self._is_valid_form_input(inp)}
+        btn = next((inp for inp in inputs if inp.get('type') == 'submit'), None)
+        submit = (btn['name'], btn.get('value', 'Login')) if btn and btn.get('name') else None
+        return LoginForm(u_field, p_field, fields, submit)
 
-    def _get_login_fields(self, soup):
-        u_field = next((f for f in ['ctl00$cph1$txtStuUser', 'txtUserName', 'UserId'] if soup.find('input', {'name': f})), None)
-        p_field = next((f for f in ['ctl00$cph1$txtStuPsw', 'txtPassword', 'Password'] if soup.find('input', {'name': f})), None)
-        return u_field, p_field
+    def build_login_form(self, content, username, password):
+        """Returns the POST body for the login page, or None if the fields are missing."""
+        form = self.parse_login_form(content)
+        return form.fill(username, password) if form else None
 
-    def _check_login_success(self, res):
-        if "studentLogin.aspx" not in res.url and any(x in res.text.lower() for x in ['dashboard', 'attendance', 'logout']):
+    def _check_login_success(self, res, with_name=True):
+        if "studentLogin.aspx" not in str(res.url) and any(x in res.text.lower() for x in ['dashboard', 'attendance', 'logout']):
             name = ""
+            if not with_name:
+                return True, "Login successful", name
             try:
-                soup = BeautifulSoup(res.content, 'html.parser')
+                soup = make_soup(res.content, 'student_name')
                 name_span = soup.find('span', class_='d-lg-inline-flex d-none')
                 if name_span:
                     name = name_span.text.strip()
@@ -81,39 +950,19 @@ class LNCTAttendance:
             return True, "Login successful", name
         return False, "Invalid credentials", ""
 
-    def login(self, username, password):
-        try:
-            logger.info(f"Logging in as {username}")
-            r = self.session.get(self.login_url, timeout=15)
-            soup = BeautifulSoup(r.content, 'html.parser')
-            data = self.get_form_data(soup)
-
-            u_field, p_field = self._get_login_fields(soup)
-            if not (u_field and p_field):
-                return False, "Login fields not found"
-
-            data[u_field] = username
-            data[p_field] = password
-            
-            btn = soup.find('input', {'type': 'submit'})
-            if btn and btn.get('name'):
-                data[btn.get('name')] = btn.get('value', 'Login')
-
-            self.session.headers.update({'Referer': self.login_url})
-            res = self.session.post(self.login_url, data=data, timeout=15)
-
-            return self._check_login_success(res)
-
-        except Exception as e:
-            logger.error(f"Login error: {e}")
-            return False, str(e), ""
+    def _login_rejected(self, res):
+        """Whether a failed login's page shows the portal's invalid-credentials message."""
+        return LOGIN_REJECTED_RE.search(decode_html(res.content)) is not None
 
     def extract_value(self, soup, element_id, convert_type=str):
+        el = soup.find(['span', 'label'], id=element_id)
+        return self._coerce_value(el.text if el else None, convert_type)
+
+    def _coerce_value(self, text, convert_type=str):
         try:
-            el = soup.find('span', {'id': element_id}) or soup.find('label', {'id': element_id})
-            if not el:
+            if text is None:
                 return convert_type() if convert_type != int else 0
-            text = el.text.strip()
+            text = text.strip()
             if ':' in text:
                 text = text.split(':')[-1].strip()
             if convert_type == int:
@@ -142,22 +991,20 @@ class LNCTAttendance:
         try:
             total = int(cols[2]) if cols[2].isdigit() else 0
             present = int(cols[3]) if cols[3].isdigit() else 0
-            return {
-                "name": cols[0],
-                "total": total,
-                "present": present,
-                "absent": total - present,
-                "percentage": round((present / total * 100), 2) if total > 0 else 0.0
-            }
+            return SubjectRecord(
+                name=cols[0],
+                total=total,
+                present=present,
+                absent=total - present,
+                percentage=round((present / total * 100), 2) if total > 0 else 0.0
+            )
         except:
             return None
 
-    def get_subject_attendance(self):
+    def parse_subject_attendance(self, content):
         subjects = []
         try:
-            url = f"{self.base_url}/AccSoft2/parents/subwiseattn.aspx"
-            r = self.session.get(url, timeout=15)
-            soup = BeautifulSoup(r.content, 'html.parser')
+            soup = make_soup(content, 'subject_page')
             
             target_table = self._find_subject_table(soup)
             if not target_table:
@@ -174,10 +1021,18 @@ class LNCTAttendance:
             
         return subjects
 
+    def _datewise_row(self, cols):
+        return DatewiseRow(
+            date=cols[1],
+            lecture=cols[2],
+            subject=cols[3],
+            status=cols[4]
+        )
+
     def get_datewise_attendance(self, soup):
         datewise = []
         try:
-            table = soup.find('table', {'id': 'ctl00_ctl00_ContentPlaceHolder1_cp2_Gridview1'})
+            table = soup.find('table', id=DATEWISE_TABLE_ID)
             if not table:
                 return []
 
@@ -187,122 +1042,1114 @@ class LNCTAttendance:
                 if not cols: continue
                 
                 if len(cols) >= 5:
-                    datewise.append({
-                        "date": cols[1].text.strip(),
-                        "lecture": cols[2].text.strip(),
-                        "subject": cols[3].text.strip(),
-                        "status": cols[4].text.strip()
-                    })
+                    datewise.append(self._datewise_row([c.text.strip() for c in cols]))
                     
         except Exception as e:
             logger.error(f"Error parsing datewise: {e}")
             
         return datewise
 
-    def get_personal_details(self):
+    def _get_datewise_attendance_lxml(self, doc):
+        datewise = []
+        try:
+            for table in doc.xpath('//table[@id=$id]', id=DATEWISE_TABLE_ID)[:1]:
+                for row in table.xpath('.//tr')[1:]:
+                    cols = row.xpath('.//td')
+                    if len(cols) >= 5:
+                        datewise.append(self._datewise_row([c.text_content().strip() for c in cols]))
+        except Exception as e:
+            logger.error(f"Error parsing datewise: {e}")
+        return datewise
+
+    def _datewise_rows_span(self, text):
+        """Span of the datewise rows markup: after the header row, up to </table>."""
+        table = text.find(DATEWISE_TABLE_ID)
+        if table < 0:
+            return None
+        header_end = text.find('</tr>', table)
+        end = text.find('</table>', header_end)
+        if header_end < 0 or end < 0:
+            return None
+        return header_end + len('</tr>'), end
+
+    def _parse_datewise_fragment(self, markup):
+        """Parse bare datewise <tr> rows by wrapping them back into the grid table."""
+        if not markup.strip():
+            return []
+        wrapped = f'<table id="{DATEWISE_TABLE_ID}"><tr></tr>{markup}</table>'
+        if HTML_PARSER == 'lxml':
+            return self._get_datewise_attendance_lxml(make_lxml_tree(wrapped))
+        return self.get_datewise_attendance(make_soup(wrapped, 'attendance_page'))
+
+    def _parse_attendance_tree(self, content, with_datewise=True):
+        if HTML_PARSER == 'lxml':
+            doc = make_lxml_tree(content)
+
+            def value_of(element_id):
+                els = doc.xpath('(//span|//label)[@id=$id]', id=element_id)
+                return self._coerce_value(els[0].text_content() if els else None, int)
+
+            datewise = self._get_datewise_attendance_lxml(doc) if with_datewise else None
+        else:
+            soup = make_soup(content, 'attendance_page')
+
+            def value_of(element_id):
+                return self.extract_value(soup, element_id, int)
+
+            datewise = self.get_datewise_attendance(soup) if with_datewise else None
+
+        data = {}
+        for key, id_list in SUMMARY_IDS.items():
+            for _id in id_list:
+                val = value_of(_id)
+                if val > 0:
+                    data[key] = val
+                    break
+            else:
+                data[key] = 0
+        return data, datewise
+
+    def parse_attendance_page(self, content, datewise_store=None):
+        """
+        Returns (summary counts, datewise rows, sync info) from
+        StuAttendanceStatus.aspx. With a DatewiseStore, only rows the store
+        has not seen are parsed; sync info is None without one.
+        """
+        text = decode_html(content)
+        span = self._datewise_rows_span(text) if datewise_store is not None else None
+        if span is None:
+            data, datewise = self._parse_attendance_tree(text)
+            return data, datewise, None
+
+        start, end = span
+        markup = text[start:end]
+        # The summary comes from the page with the rows cut out
+        data, _ = self._parse_attendance_tree(text[:start] + text[end:], with_datewise=False)
+        with datewise_store.lock:
+            mode, fragment = datewise_store.plan(markup)
+            sync = datewise_store.merge(mode, self._parse_datewise_fragment(fragment), markup)
+            datewise = datewise_store.rows
+        return data, datewise, sync
+
+    def parse_personal_details(self, content):
         details = {"enrollment_no": "N/A"}
         try:
-            url = f"{self.base_url}/AccSoft2/Parents/StudentPersonalDetails.aspx"
-            r = self.session.get(url, timeout=15)
-            soup = BeautifulSoup(r.content, 'html.parser')
+            soup = make_soup(content, 'personal_details')
             
-            # ID for enrollment no: ctl00_ContentPlaceHolder1_txtUEnrollNo
-            el = soup.find('input', {'id': 'ctl00_ContentPlaceHolder1_txtUEnrollNo'})
+            el = soup.find('input', id=ENROLLMENT_NO_ID)
             if el:
                 details["enrollment_no"] = el.get('value', '').strip()
             else:
-                el = soup.find(['span', 'label'], {'id': 'ctl00_ContentPlaceHolder1_txtUEnrollNo'})
+                el = soup.find(['span', 'label'], id=ENROLLMENT_NO_ID)
                 if el:
                     details["enrollment_no"] = el.text.strip()
                         
         except Exception as e:
-            logger.error(f"Error fetching enrollment no: {e}")
+            logger.error(f"Error parsing enrollment no: {e}")
             
         return details
 
-    def get_attendance(self):
+    def parse_attendance_summary(self, content):
+        """Summary counts from StuAttendanceStatus.aspx, without parsing the datewise grid."""
+        text = decode_html(content)
+        span = self._datewise_rows_span(text)
+        if span is not None:
+            text = text[:span[0]] + text[span[1]:]
+        data, _ = self._parse_attendance_tree(text, with_datewise=False)
+        return data
+
+    def parse_attendance(self, pages, start, datewise_store=None, sections=ALL_SECTIONS):
+        """
+        Build the attendance result from fetched pages. `pages` maps a page
+        key to (response, elapsed_ms), or to the exception raised fetching it,
+        and holds the pages `sections` need (see _page_urls). The first page
+        decides whether the session is still valid; the summary counts come
+        with any section read from the attendance page.
+        """
+        first = next(iter(pages))
+        if isinstance(pages[first], Exception):
+            raise pages[first]
+        for page in pages.values():
+            # The portal being refused or unreachable is not an empty page:
+            # fail the scrape rather than cache a snapshot missing sections
+            if isinstance(page, (PortalUnavailable, httpx.TransportError)):
+                raise page
+            if not isinstance(page, Exception):
+                check_portal_response(page[0])
+        if "studentLogin.aspx" in str(pages[first][0].url):
+            return None, "Session expired"
+
+        result = {}
+        if 'attendance_page' in pages:
+            content = pages['attendance_page'][0].content
+            if 'datewise' in sections:
+                data, datewise, datewise_sync = self.parse_attendance_page(content, datewise_store)
+            else:
+                data = self.parse_attendance_summary(content)
+
+            percentage = round((data['present'] / data['total_classes']) * 100, 2) if data['total_classes'] > 0 else 0.0
+            result.update(data, percentage=percentage, overall_percentage=percentage, attended_classes=data['present'])
+
+        if 'subjects' in sections:
+            if isinstance(pages['subject_page'], Exception):
+                logger.error(f"Error fetching subjects: {pages['subject_page']}")
+                result['subjects'] = []
+            else:
+                result['subjects'] = self.parse_subject_attendance(pages['subject_page'][0].content)
+
+        if 'datewise' in sections:
+            result['datewise'] = datewise
+            if datewise_sync:
+                result['datewise_sync'] = datewise_sync
+
+        if 'personal_details' in sections:
+            if isinstance(pages['personal_details_page'], Exception):
+                logger.error(f"Error fetching enrollment no: {pages['personal_details_page']}")
+                result['personal_details'] = {"enrollment_no": "N/A"}
+            else:
+                result['personal_details'] = self.parse_personal_details(pages['personal_details_page'][0].content)
+
+        timings = {
+            f"{key}_ms": page[1]
+            for key, page in pages.items()
+            if not isinstance(page, Exception)
+        }
+        timings['total_ms'] = round((time.perf_counter() - start) * 1000, 1)
+        result['timings'] = timings
+
+        return result, "Success"
+
+    def _page_urls(self, sections=ALL_SECTIONS):
+        """URLs of the pages `sections` are read from, attendance page first."""
+        needed = {SECTION_PAGES[s] for s in sections}
+        urls = {
+            'attendance_page': self.attendance_url,
+            'subject_page': self.subject_url,
+            'personal_details_page': self.personal_details_url
+        }
+        return {key: url for key, url in urls.items() if key in needed}
+
+
+class LNCTAttendance(PortalParser):
+    """Blocking scraper on requests. Kept for scripts and as the benchmark baseline."""
+
+    def __init__(self, base_url=PORTAL_BASE_URL):
+        import requests
+        super().__init__(base_url)
+        adapter = get_portal_http_adapter()
+        self.session = requests.Session()
+        self.session.headers.update(PORTAL_HEADERS)
+        self.session.verify = False
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+    def _timed_get(self, url):
+        start = time.perf_counter()
+        r = self.session.get(url, timeout=PORTAL_SYNC_TIMEOUT)
+        return r, round((time.perf_counter() - start) * 1000, 1)
+
+    def login(self, username, password):
         try:
-            r = self.session.get(self.attendance_url, timeout=15)
-            if "studentLogin.aspx" in r.url:
-                return None, "Session expired"
+            logger.info(f"Logging in as {username}")
+            r = self.session.get(self.login_url, timeout=PORTAL_SYNC_TIMEOUT)
+            data = self.build_login_form(r.content, username, password)
+            if data is None:
+                return False, "Login fields not found"
 
-            soup = BeautifulSoup(r.content, 'html.parser')
+            self.session.headers.update({'Referer': self.login_url})
+            res = self.session.post(self.login_url, data=data, timeout=PORTAL_SYNC_TIMEOUT)
 
-            ids = {
-                'total_classes': ['ctl00_ctl00_ContentPlaceHolder1_cp2_lbltotperiod111'],
-                'present': ['ctl00_ctl00_ContentPlaceHolder1_cp2_lbltotalp11'],
-                'absent': ['ctl00_ctl00_ContentPlaceHolder1_cp2_lbltotala11']
-            }
+            return self._check_login_success(res)
 
-            data = {}
-            for key, id_list in ids.items():
-                for _id in id_list:
-                    val = self.extract_value(soup, _id, int)
-                    if val > 0:
-                        data[key] = val
-                        break
-                else:
-                    data[key] = 0
+        except Exception as e:
+            logger.error(f"Login error: {e}")
+            return False, str(e), ""
 
-            percentage = round((data['present'] / data['total_classes']) * 100, 2) if data['total_classes'] > 0 else 0.0
+    def get_subject_attendance(self):
+        try:
+            r = self.session.get(self.subject_url, timeout=PORTAL_SYNC_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Error fetching subjects: {e}")
+            return []
+        return self.parse_subject_attendance(r.content)
+
+    def get_personal_details(self):
+        try:
+            r = self.session.get(self.personal_details_url, timeout=PORTAL_SYNC_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Error fetching enrollment no: {e}")
+            return {"enrollment_no": "N/A"}
+        return self.parse_personal_details(r.content)
+
+    def _fetch_pages(self):
+        """
+        Fetch the attendance, subject-wise and personal-details pages in
+        parallel over this session's cookies. Returns {key: (response, ms)},
+        with the exception in place of the tuple for a page that failed.
+        """
+        futures = {key: portal_executor.submit(self._timed_get, url) for key, url in self._page_urls().items()}
+        pages = {}
+        for key, future in futures.items():
+            try:
+                pages[key] = future.result()
+            except Exception as e:
+                pages[key] = e
+        return pages
+
+    def get_attendance(self, datewise_store=None):
+        try:
+            start = time.perf_counter()
+            return self.parse_attendance(self._fetch_pages(), start, datewise_store)
+        except Exception as e:
+            logger.error(f"Attendance error: {e}")
+            return None, f"Attendance error: {e}"
 
-            subjects = self.get_subject_attendance()
-            datewise = self.get_datewise_attendance(soup)
-            personal_details = self.get_personal_details()
 
-            return {
-                **data,
-                'percentage': percentage,
-                'overall_percentage': percentage,
-                'attended_classes': data['present'],
-                'subjects': subjects,
-                'datewise': datewise,
-                'personal_details': personal_details
-            }, "Success"
+class AsyncLNCTAttendance(PortalParser):
+    """
+    Non-blocking scraper on httpx used by the API. Page fetches run
+    concurrently on the event loop and BeautifulSoup parsing is moved to a
+    worker thread, so a slow portal never ties up the server's threadpool.
+    """
 
+    def __init__(self, base_url=PORTAL_BASE_URL, transport=None):
+        super().__init__(base_url)
+        self.client = httpx.AsyncClient(
+            transport=transport or get_portal_transport(),
+            headers=PORTAL_HEADERS,
+            follow_redirects=True,
+            timeout=PORTAL_TIMEOUT
+        )
+        self._owns_transport = transport is not None
+
+    async def aclose(self):
+        # Closing the client closes its transport, which must not happen to
+        # the shared pool; dropping the client is enough to release cookies.
+        if self._owns_transport:
+            await self.client.aclose()
+
+    def dump_cookies(self):
+        """Portal cookies as plain dicts, for the session store."""
+        return [{'name': c.name, 'value': c.value, 'domain': c.domain, 'path': c.path} for c in self.client.cookies.jar]
+
+    def load_cookies(self, cookies):
+        for c in cookies:
+            self.client.cookies.set(c['name'], c['value'], domain=c['domain'], path=c['path'])
+
+    async def _get(self, url, stage='fetch'):
+        """GET with bounded exponential-backoff retries on transport errors and 502/503/504."""
+        for attempt in range(PORTAL_GET_RETRIES + 1):
+            try:
+                r = await portal_guard.send(self.client.get, url)
+                if r.status_code >= 500:
+                    PORTAL_ERRORS.inc(stage)
+                if r.status_code not in PORTAL_RETRY_STATUSES or attempt == PORTAL_GET_RETRIES:
+                    return r
+            except httpx.TransportError as e:
+                count_portal_failure(stage, e)
+                if attempt == PORTAL_GET_RETRIES:
+                    raise
+            await asyncio.sleep(PORTAL_RETRY_BACKOFF * (2 ** attempt))
+
+    async def _timed_get(self, url):
+        start = time.perf_counter()
+        r = await self._get(url)
+        return r, round((time.perf_counter() - start) * 1000, 1)
+
+    async def login(self, username, password, with_name=True):
+        """(ok, message, student name); without `with_name` the name is not parsed and comes back empty."""
+        with LOGIN_SECONDS.time():
+            return await self._login(username, password, with_name)
+
+    async def _login(self, username, password, with_name):
+        try:
+            logger.info(f"Logging in as {username}")
+            cached = login_forms.get(self.login_url)
+            reused = cached is not None and cached.strikes < LOGIN_FORM_MAX_STRIKES
+            form = cached if reused else await self._fetch_login_form()
+            if form is None:
+                return False, "Login fields not found"
+            LOGIN_FORMS.inc('cache' if reused else 'fetch')
+
+            res = await self._post_login(form, username, password)
+            result = await asyncio.to_thread(self._check_login_success, res, with_name)
+            if reused and result[0]:
+                form.strikes = 0
+            elif reused:
+                # The portal saying the credentials are wrong means it took the
+                # form: retrying would only cost another failed attempt
+                if res.status_code < 400 and await asyncio.to_thread(self._login_rejected, res):
+                    return result
+                # Otherwise the form may be what it refused (expired
+                # ViewState, changed fields): drop it and try a fresh one
+                login_forms.pop(self.login_url, None)
+                form = await self._fetch_login_form()
+                if form is None:
+                    return False, "Login fields not found"
+                res = await self._post_login(form, username, password)
+                result = await asyncio.to_thread(self._check_login_success, res, with_name)
+                if result[0]:
+                    LOGIN_FORMS.inc('stale')
+                    form.strikes = cached.strikes + 1
+            if not result[0]:
+                # An error page from the portal is an outage, not bad credentials
+                check_portal_response(res)
+            # While reuse is off the cached form is left to expire, not refreshed
+            if result[0] and (cached is None or reused):
+                login_forms[self.login_url] = form
+            return result
+
+        except (PortalUnavailable, httpx.TransportError):
+            # The portal, not the credentials, failed
+            raise
+        except Exception as e:
+            logger.error(f"Login error: {e}")
+            return False, str(e), ""
+
+    async def _fetch_login_form(self):
+        r = check_portal_response(await self._get(self.login_url, stage='login'))
+        return await asyncio.to_thread(self.parse_login_form, r.content)
+
+    async def _post_login(self, form, username, password):
+        self.client.headers['Referer'] = self.login_url
+        try:
+            res = await portal_guard.send(self.client.post, self.login_url, data=form.fill(username, password))
+        except httpx.TransportError as e:
+            count_portal_failure('login', e)
+            raise
+        if res.status_code >= 500:
+            PORTAL_ERRORS.inc('login')
+        return res
+
+    async def _fetch_pages(self, sections=ALL_SECTIONS):
+        urls = self._page_urls(sections)
+        with portal_guard.batch():
+            results = await asyncio.gather(*(self._timed_get(url) for url in urls.values()), return_exceptions=True)
+        pages = dict(zip(urls.keys(), results))
+        for key, page in pages.items():
+            if not isinstance(page, BaseException):
+                FETCH_SECONDS.observe(page[1] / 1000, key)
+        return pages
+
+    async def get_attendance(self, datewise_store=None, sections=ALL_SECTIONS):
+        """Fetch and parse the pages `sections` need. `datewise_store` is used for the datewise section."""
+        try:
+            start = time.perf_counter()
+            pages = await self._fetch_pages(sections)
+            with PARSE_SECONDS.time():
+                return await asyncio.to_thread(self.parse_attendance, pages, start, datewise_store, sections)
+        except (PortalUnavailable, httpx.TransportError):
+            # Not the session's fault: keep it for when the portal is back
+            raise
         except Exception as e:
             logger.error(f"Attendance error: {e}")
             return None, f"Attendance error: {e}"
 
 
+# ==============================
+# COMPRESSION & CONDITIONAL GET
+# ==============================
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Bodies smaller than this go out uncompressed
+COMPRESS_MIN_SIZE = int(os.environ.get("COMPRESS_MIN_SIZE", "500"))
+GZIP_LEVEL = int(os.environ.get("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.environ.get("BROTLI_QUALITY", "5"))
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/x-ndjson", "application/javascript",
+                      "application/manifest+json", "image/svg+xml")
+
+
+def pick_encoding(accept_encoding):
+    """Content coding to use for an Accept-Encoding header: br, then gzip, else None."""
+    accepted = set()
+    for part in accept_encoding.lower().split(','):
+        coding, _, params = part.partition(';')
+        if params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            accepted.add(coding.strip())
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+class StreamCompressor:
+    """Incremental br/gzip encoder; every chunk is flushed so streamed lines reach the client."""
+
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == 'br':
+            self.compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        else:
+            self.compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data, final):
+        if self.encoding == 'br':
+            out = self.compressor.process(data)
+            return out + (self.compressor.finish() if final else self.compressor.flush())
+        return self.compressor.compress(data) + self.compressor.flush(zlib.Z_FINISH if final else zlib.Z_SYNC_FLUSH)
+
+
+def compress_bytes(data, encoding):
+    return StreamCompressor(encoding).compress(data, final=True)
+
+
+class CompressionMiddleware:
+    """
+    Compress text-like responses with brotli (when installed) or gzip, as
+    the client allows. Responses that already carry a Content-Encoding,
+    such as pre-compressed static assets, are passed through untouched.
+    """
+
+    def __init__(self, app, minimum_size=COMPRESS_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        encoding = pick_encoding(Headers(scope=scope).get('accept-encoding', '')) if scope['type'] == 'http' else None
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None
+        compressor = None
+
+        async def send_compressed(message):
+            nonlocal start, compressor
+            if message['type'] == 'http.response.start':
+                headers = Headers(raw=message['headers'])
+                if ('content-encoding' in headers or message['status'] in (204, 206, 304)
+                        or not headers.get('content-type', '').startswith(COMPRESSIBLE_TYPES)):
+                    await send(message)
+                else:
+                    # Hold the headers until the first body chunk shows whether to compress
+                    start = message
+                return
+            if start is None or message['type'] != 'http.response.body':
+                await send(message)
+                return
+
+            body = message.get('body', b'')
+            more_body = message.get('more_body', False)
+            if compressor is None:
+                headers = MutableHeaders(raw=start['headers'])
+                headers.add_vary_header('Accept-Encoding')
+                if not more_body and len(body) < self.minimum_size:
+                    await send(start)
+                    await send(message)
+                    start = None
+                    return
+                compressor = StreamCompressor(encoding)
+                headers['Content-Encoding'] = encoding
+                body = compressor.compress(body, final=not more_body)
+                if more_body:
+                    del headers['Content-Length']
+                else:
+                    headers['Content-Length'] = str(len(body))
+                await send(start)
+            else:
+                body = compressor.compress(body, final=not more_body)
+            await send({'type': 'http.response.body', 'body': body, 'more_body': more_body})
+
+        await self.app(scope, receive, send_compressed)
+
+
+app.add_middleware(CompressionMiddleware)
+
+
+def etag_matches(request, etag):
+    """If-None-Match check with weak comparison, as RFC 9110 asks for GET."""
+    header = request.headers.get('if-none-match')
+    if not header:
+        return False
+    if header.strip() == '*':
+        return True
+    opaque = etag[2:] if etag.startswith('W/') else etag
+    return any((tag.strip()[2:] if tag.strip().startswith('W/') else tag.strip()) == opaque for tag in header.split(','))
+
+
+def snapshot_content_hash(data):
+    """Digest of a scraped snapshot, ignoring fields that change on every scrape."""
+    stable = {k: v for k, v in data.items() if k not in ('timings', 'datewise_sync')}
+    payload = json.dumps(stable, sort_keys=True, default=json_default).encode()
+    return hashlib.blake2b(payload, digest_size=12).hexdigest()
+
+
+def check_etag(request, response, data):
+    """
+    Tag a snapshot-backed response and answer If-None-Match. The ETag is weak:
+    it covers the snapshot content and the query (minus credentials), not the
+    freshness fields, which change on every call. Returns a 304 response
+    when the client's copy is current, else None.
+    """
+    params = sorted((k, v) for k, v in request.query_params.multi_items() if k not in ('username', 'password'))
+    variant = hashlib.blake2b(repr((request.url.path, params)).encode(), digest_size=6).hexdigest()
+    etag = f'W/"{data["snapshot"]["content_hash"]}-{variant}"'
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers={'ETag': etag})
+    response.headers['ETag'] = etag
+    return None
+
+
+# Seconds between checks of a static file's mtime; edits show up within this
+STATIC_RECHECK_SECONDS = float(os.environ.get("STATIC_RECHECK_SECONDS", "2"))
+
+
+class StaticAsset:
+    """A static file kept in memory with its content hash and compressed copies."""
+
+    def __init__(self, path, mtime):
+        self.mtime = mtime
+        with open(path, 'rb') as f:
+            self.body = f.read()
+        self.etag = f'W/"{hashlib.blake2b(self.body, digest_size=12).hexdigest()}"'
+        self.encoded = {}
+        self.checked = time.monotonic()
+
+    def compressed(self, encoding):
+        """Whether body_for(encoding) is ready without compressing anything."""
+        return encoding is None or len(self.body) < COMPRESS_MIN_SIZE or encoding in self.encoded
+
+    def body_for(self, encoding):
+        if encoding is None or len(self.body) < COMPRESS_MIN_SIZE:
+            return self.body, None
+        if encoding not in self.encoded:
+            self.encoded[encoding] = compress_bytes(self.body, encoding)
+        return self.encoded[encoding], encoding
+
+
+static_assets = {}
+
+
+def load_static_asset(path):
+    """The StaticAsset for `path`, re-read if its mtime changed. Blocks on disk."""
+    mtime = os.stat(path).st_mtime_ns
+    asset = static_assets.get(path)
+    if asset is None or asset.mtime != mtime:
+        asset = static_assets[path] = StaticAsset(path, mtime)
+    asset.checked = time.monotonic()
+    return asset
+
+
+async def serve_static(request, path, media_type):
+    """
+    Serve a file from static/ with a content-hash ETag and a pre-compressed
+    body. Files are re-read only when their mtime changes, which is checked
+    at most every STATIC_RECHECK_SECONDS; disk reads and compression run in
+    a worker thread. Clients revalidate on every load (no-cache), which costs
+    a 304 while the file is unchanged.
+    """
+    asset = static_assets.get(path)
+    if asset is None or time.monotonic() - asset.checked >= STATIC_RECHECK_SECONDS:
+        asset = await asyncio.to_thread(load_static_asset, path)
+
+    headers = {'ETag': asset.etag, 'Cache-Control': 'no-cache', 'Vary': 'Accept-Encoding'}
+    if etag_matches(request, asset.etag):
+        return Response(status_code=304, headers=headers)
+    encoding = pick_encoding(request.headers.get('accept-encoding', ''))
+    if asset.compressed(encoding):
+        body, encoding = asset.body_for(encoding)
+    else:
+        body, encoding = await asyncio.to_thread(asset.body_for, encoding)
+    if encoding:
+        headers['Content-Encoding'] = encoding
+    return Response(body, media_type=media_type, headers=headers)
+
+
+# ==============================
+# SESSION STORE
+# ==============================
+
+# Authenticated portal sessions (cookies and student name) kept outside the
+# process, so any worker can pick up a student's login and deploys don't log
+# everyone out. Live scrapers still sit in the per-process user_sessions
+# dict; the store only holds what is needed to rebuild one.
+SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "memory")
+SESSION_TTL = float(os.environ.get("SESSION_TTL", "3600"))
+SESSION_MAXSIZE = int(os.environ.get("SESSION_MAXSIZE", "1024"))
+SESSION_REAP_INTERVAL = float(os.environ.get("SESSION_REAP_INTERVAL", "60"))
+SESSION_SQLITE_PATH = os.environ.get("SESSION_SQLITE_PATH", "sessions.db")
+# memory:// selects the in-process LocalRedis stand-in instead of a server
+SESSION_REDIS_URL = os.environ.get("SESSION_REDIS_URL", "redis://localhost:6379/0")
+
+
+class MemorySessionBackend:
+    """Sessions for this process only; lost on restart."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.records = {}
+        self._secret = os.urandom(16)
+
+    def secret(self):
+        return self._secret
+
+    def get(self, username):
+        with self.lock:
+            item = self.records.get(username)
+            if item is None:
+                return None
+            if item[0] <= time.time():
+                del self.records[username]
+                return None
+            return json.loads(item[1])
+
+    def set(self, username, record, ttl):
+        with self.lock:
+            self.records[username] = (time.time() + ttl, json.dumps(record))
+
+    def delete(self, username):
+        with self.lock:
+            self.records.pop(username, None)
+
+
+class SQLiteSessionBackend:
+    """Sessions in a SQLite file, shared by every worker on the host and kept across restarts."""
+
+    def __init__(self, path, record_type="session"):
+        self.path = path
+        self.table = record_type + "s"
+        self.local = threading.local()
+        db = self._db()
+        db.execute(f"CREATE TABLE IF NOT EXISTS {self.table} (username TEXT PRIMARY KEY, record TEXT NOT NULL, expires REAL NOT NULL)")
+        db.execute(f"CREATE INDEX IF NOT EXISTS {self.table}_expires ON {self.table} (expires)")
+        db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        db.commit()
+
+    def _db(self):
+        # sqlite3 connections can't be shared between threads, and store
+        # calls arrive on asyncio.to_thread workers
+        db = getattr(self.local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=10)
+            db.execute("PRAGMA journal_mode=WAL")
+            self.local.db = db
+        return db
+
+    def secret(self):
+        db = self._db()
+        # First worker to start picks the secret; the rest read it back
+        db.execute("INSERT OR IGNORE INTO meta VALUES ('secret', ?)", (os.urandom(16).hex(),))
+        db.commit()
+        return bytes.fromhex(db.execute("SELECT value FROM meta WHERE key = 'secret'").fetchone()[0])
+
+    def get(self, username):
+        row = self._db().execute(
+            f"SELECT record FROM {self.table} WHERE username = ? AND expires > ?", (username, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, username, record, ttl):
+        now = time.time()
+        db = self._db()
+        db.execute(f"INSERT OR REPLACE INTO {self.table} VALUES (?, ?, ?)", (username, json.dumps(record), now + ttl))
+        db.execute(f"DELETE FROM {self.table} WHERE expires <= ?", (now,))
+        db.commit()
+
+    def delete(self, username):
+        db = self._db()
+        db.execute(f"DELETE FROM {self.table} WHERE username = ?", (username,))
+        db.commit()
+
+
+class LocalRedis:
+    """
+    In-process stand-in for the few Redis commands RedisSessionBackend uses
+    (GET, SET with PX/NX, DELETE), for tests and local runs without a server.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.data = {}
+
+    def _live(self, key):
+        item = self.data.get(key)
+        if item is not None and item[1] is not None and item[1] <= time.time():
+            del self.data[key]
+            return None
+        return item
+
+    def get(self, key):
+        with self.lock:
+            item = self._live(key)
+            return item[0] if item else None
+
+    def set(self, key, value, px=None, nx=False):
+        with self.lock:
+            if nx and self._live(key) is not None:
+                return None
+            value = value.encode() if isinstance(value, str) else value
+            self.data[key] = (value, time.time() + px / 1000 if px else None)
+            return True
+
+    def delete(self, *keys):
+        with self.lock:
+            return sum(self.data.pop(key, None) is not None for key in keys)
+
+
+class RedisSessionBackend:
+    """Sessions in Redis, shared by workers on any host. Expiry is left to Redis."""
+
+    def __init__(self, client, prefix="lnctu:", record_type="session"):
+        self.client = client
+        self.prefix = prefix
+        self.record_prefix = f"{prefix}{record_type}:"
+
+    def secret(self):
+        key = self.prefix + "secret"
+        self.client.set(key, os.urandom(16).hex(), nx=True)
+        value = self.client.get(key)
+        return bytes.fromhex(value.decode() if isinstance(value, bytes) else value)
+
+    def get(self, username):
+        value = self.client.get(self.record_prefix + username)
+        return json.loads(value) if value else None
+
+    def set(self, username, record, ttl):
+        self.client.set(self.record_prefix + username, json.dumps(record), px=int(ttl * 1000))
+
+    def delete(self, username):
+        self.client.delete(self.record_prefix + username)
+
+
+def make_session_backend(kind=SESSION_BACKEND, record_type="session"):
+    """Backend of the given kind for one type of per-student record."""
+    if kind == "memory":
+        return MemorySessionBackend()
+    if kind == "sqlite":
+        return SQLiteSessionBackend(SESSION_SQLITE_PATH, record_type)
+    if kind == "redis":
+        if SESSION_REDIS_URL.startswith("memory://"):
+            return RedisSessionBackend(LocalRedis(), record_type=record_type)
+        try:
+            import redis
+        except ImportError:
+            raise RuntimeError("SESSION_BACKEND=redis needs the redis package (pip install redis)")
+        return RedisSessionBackend(redis.Redis.from_url(SESSION_REDIS_URL), record_type=record_type)
+    raise ValueError(f"Unknown SESSION_BACKEND: {kind}")
+
+
+session_backend = make_session_backend()
+# Credential digests must match across workers, so the HMAC key comes from
+# the environment or the shared store rather than from each process.
+_credential_salt = os.environ.get("SESSION_SECRET", "").encode() or session_backend.secret()
+
+
+class SessionCache(TTLCache):
+    """
+    Live scrapers for this process. Expiry slides: writing a session back
+    after use restarts its TTL, and the least recently used session goes
+    first once SESSION_MAXSIZE is reached. Sessions dropped by either rule
+    are kept until reap_sessions() closes them.
+    """
+
+    def __init__(self, maxsize, ttl):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.dropped = []
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        self.dropped.extend(session for _, session in expired)
+        return expired
+
+    def popitem(self):
+        key, session = super().popitem()
+        self.dropped.append(session)
+        return key, session
+
+    def drain_dropped(self):
+        dropped, self.dropped = self.dropped, []
+        return dropped
+
+
+user_sessions = SessionCache(maxsize=SESSION_MAXSIZE, ttl=SESSION_TTL)
+
+# Student profiles (name and personal details) barely change in a semester,
+# so they are kept far longer than sessions, in the same kind of store, and
+# survive re-logins and restarts. Once a profile is known, scrapes skip the
+# personal-details page and logins skip parsing the name.
+PROFILE_TTL = float(os.environ.get("PROFILE_TTL", str(30 * 24 * 3600)))
+profile_backend = make_session_backend(record_type="profile")
+profile_cache = TTLCache(maxsize=SESSION_MAXSIZE, ttl=PROFILE_TTL)
+
+
+async def reap_sessions():
+    """Background task: expire idle sessions and close their scrapers."""
+    while True:
+        await asyncio.sleep(SESSION_REAP_INTERVAL)
+        user_sessions.expire()
+        for session in user_sessions.drain_dropped():
+            await session['lnct'].aclose()
+
+
 # ==============================
 # SESSION HELPERS
 # ==============================
 
-def cleanup_expired_sessions():
-    now = datetime.now()
-    expired = [u for u, s in user_sessions.items() if now - s['last_login'] > timedelta(hours=1)]
-    for u in expired:
-        del user_sessions[u]
-
-def _get_or_create_session(username, password):
-    if username in user_sessions:
-        lnct = user_sessions[username]['lnct']
-        name = user_sessions[username].get('name', '')
-        data, msg = lnct.get_attendance()
-        if data:
-            data['student_name'] = name
-            return data, "Used cached session"
-        del user_sessions[username]
+def _credential_digest(username, password):
+    return hmac.new(_credential_salt, f"{username}\0{password}".encode(), hashlib.sha256).digest()
+
+def _snapshot_response(entry, from_cache, stale=False):
+    data = dict(entry['data'])
+    data['snapshot'] = {
+        'content_hash': entry['content_hash'],
+        'from_cache': from_cache,
+        'stale': stale,
+        'age_seconds': round(time.time() - entry['fetched_at'], 2),
+        'fetched_at': datetime.fromtimestamp(entry['fetched_at']).isoformat(timespec='seconds')
+    }
+    return data
+
+def _get_cached_snapshot(username, password):
+    with snapshot_cache_lock:
+        entry = snapshot_cache.get(username)
+    # The cache is keyed by username only, so never hand out a snapshot
+    # unless the caller presented the same password that produced it.
+    if entry and hmac.compare_digest(entry['credential'], _credential_digest(username, password)):
+        return entry
+    return None
+
+def _store_snapshot(username, password, data, content_hash, sections):
+    entry = {
+        'data': data,
+        'sections': sections,
+        'content_hash': content_hash,
+        'credential': _credential_digest(username, password),
+        'fetched_at': time.time()
+    }
+    with snapshot_cache_lock:
+        snapshot_cache[username] = entry
+    return entry
 
-    lnct = LNCTAttendance()
-    result = lnct.login(username, password)
+def _start_flight(key, factory):
+    """
+    The running task for key, starting factory() if there is none.
+    Returns (task, shared) where shared is True if the task was already running.
+    """
+    task = inflight_scrapes.get(key)
+    shared = task is not None and not task.done()
+    if not shared:
+        task = asyncio.ensure_future(factory())
+        inflight_scrapes[key] = task
+        task.add_done_callback(lambda t: inflight_scrapes.pop(key, None) if inflight_scrapes.get(key) is t else None)
+    return task, shared
+
+async def _single_flight(username, password, sections):
+    """
+    Snapshot holding `sections` from the student's running scrape, starting
+    one if there is none. Returns ((entry, message), shared) where shared is
+    True if this caller joined a scrape started by someone else.
+
+    There is one flight per student whatever the sections: a running scrape
+    that lacks some of them is awaited, then only the missing pages are
+    fetched over the session it logged in, so concurrent callers never log
+    in or fetch a page twice.
+    """
+    key = _flight_key(username, password)
+    task, shared = _start_flight(key, lambda: _refresh_snapshot(username, password, sections))
+    # shield: a client disconnecting must not cancel the scrape others wait on
+    entry, msg = await asyncio.shield(task)
+    while not sections <= entry['sections']:
+        task, _ = _start_flight(key, functools.partial(_extend_snapshot, username, password, entry, sections - entry['sections']))
+        entry, msg = await asyncio.shield(task)
+    return (entry, msg), shared
+
+def _flight_key(username, password):
+    # Keyed on the credentials too, so a wrong password never piggybacks
+    # on another caller's successful login.
+    return username, _credential_digest(username, password)
+
+def _revalidate_snapshot(username, password, sections):
+    """Refresh a stale snapshot in the background; nobody awaits the result."""
+    key = _flight_key(username, password)
+    task, shared = _start_flight(key, lambda: _refresh_snapshot(username, password, sections))
+    if not shared:
+        task.add_done_callback(lambda t: _revalidated(username, t))
+
+def _revalidated(username, task):
+    if task.cancelled():
+        return
+    error = task.exception()
+    if isinstance(error, HTTPException) and error.status_code == 401:
+        # The password no longer works: stop serving what it unlocked
+        with snapshot_cache_lock:
+            snapshot_cache.pop(username, None)
+    elif error is not None:
+        # Keep serving the stale copy; the next request past it tries again
+        logger.warning(f"Background refresh failed for {username}: {error}")
+
+async def _refresh_snapshot(username, password, sections=ALL_SECTIONS):
+    data, msg = await _scrape_attendance(username, password, sections)
+    return await _cache_snapshot(username, password, data, sections), msg
+
+async def _extend_snapshot(username, password, base, missing):
+    """Add `missing` sections to the snapshot `base`, fetching only their pages."""
+    data, msg = await _scrape_attendance(username, password, missing)
+    data = {**base['data'], **data}
+    return await _cache_snapshot(username, password, data, base['sections'] | missing), msg
+
+async def _cache_snapshot(username, password, data, sections):
+    content_hash = await asyncio.to_thread(snapshot_content_hash, data)
+    if 'subjects' in sections:
+        await asyncio.to_thread(build_analytics, data, content_hash)
+    return _store_snapshot(username, password, data, content_hash, sections)
+
+async def _get_or_create_session(username, password, sections=ALL_SECTIONS):
+    """
+    Snapshot holding at least `sections` (see SECTION_PAGES), from the
+    cache or a scrape of just the pages they need. Returns (data, message).
+    """
+    sections = frozenset(sections)
+    entry = _get_cached_snapshot(username, password)
+    if entry and entry['sections'] >= sections:
+        if time.time() - entry['fetched_at'] < SNAPSHOT_CACHE_TTL:
+            SNAPSHOT_REQUESTS.inc('cache')
+            return _snapshot_response(entry, True), "Served from snapshot cache"
+        SNAPSHOT_REQUESTS.inc('stale')
+        if portal_guard.is_open():
+            return _snapshot_response(entry, True, stale=True), "Portal unavailable, served last snapshot"
+        _revalidate_snapshot(username, password, entry['sections'])
+        return _snapshot_response(entry, True, stale=True), "Served stale snapshot, refreshing in background"
+
+    if entry:
+        # Re-scrape what the cached snapshot had as well, so it never shrinks
+        sections |= entry['sections']
+    try:
+        if portal_guard.is_open():
+            raise PortalUnavailable("Portal is unavailable, try again later")
+        (entry, msg), shared = await _single_flight(username, password, sections)
+    except PortalUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": str(portal_guard.retry_after())})
+    except httpx.TimeoutException:
+        raise HTTPException(status_code=504, detail="Timed out waiting for the portal")
+    except httpx.TransportError as e:
+        raise HTTPException(status_code=502, detail=f"Portal is unreachable: {e}")
+    SNAPSHOT_REQUESTS.inc('joined' if shared else 'scraped')
+    if shared:
+        msg = "Joined in-flight fetch"
+    return _snapshot_response(entry, False), msg
+
+def _datewise_since(username, data, since):
+    """
+    Datewise rows for a response. With a `since` cursor only rows changed
+    after it are returned, provided the student's store still matches the
+    snapshot being served; otherwise the full list is sent.
+    """
+    version = data.get('datewise_sync', {}).get('version')
+    rows = None
+    if since is not None and version is not None:
+        store = get_datewise_store(username, create=False)
+        if store is not None and store.version == version:
+            rows = store.rows_since(since)
+    full = rows is None
+    if full:
+        rows = data.get('datewise', [])
+    return rows, {'version': version, 'since': since, 'full': full}
+
+async def _restore_session(username, credential):
+    """Rebuild a scraper from the shared session store, or None if there is no usable login."""
+    record = await asyncio.to_thread(session_backend.get, username)
+    if not record or not hmac.compare_digest(bytes.fromhex(record['credential']), credential):
+        return None
+    lnct = AsyncLNCTAttendance()
+    lnct.load_cookies(record['cookies'])
+    return {
+        'lnct': lnct,
+        'name': record['name'],
+        'credential': credential,
+        'last_login': datetime.fromtimestamp(record['last_login'])
+    }
+
+async def _save_session(username, session):
+    record = {
+        'credential': session['credential'].hex(),
+        'cookies': session['lnct'].dump_cookies(),
+        'name': session['name'],
+        'last_login': session['last_login'].timestamp()
+    }
+    await asyncio.to_thread(session_backend.set, username, record, SESSION_TTL)
+
+async def _load_profile(username):
+    profile = profile_cache.get(username)
+    if profile is None:
+        profile = await asyncio.to_thread(profile_backend.get, username) or {}
+        profile_cache[username] = profile
+    return profile
+
+async def _update_profile(username, profile, name, data, sections):
+    """Fill personal details in from the profile, and store what this scrape learned."""
+    if 'personal_details' in sections and 'personal_details' in profile:
+        data['personal_details'] = profile['personal_details']
+    learned = dict(profile)
+    if name:
+        learned['name'] = name
+    details = data.get('personal_details')
+    if details and details.get('enrollment_no', 'N/A') != 'N/A':
+        learned['personal_details'] = details
+    if learned != profile:
+        profile_cache[username] = learned
+        await asyncio.to_thread(profile_backend.set, username, learned, PROFILE_TTL)
+
+def _datewise_store_for(username, sections):
+    return get_datewise_store(username) if 'datewise' in sections else None
+
+async def _scrape_attendance(username, password, sections=ALL_SECTIONS):
+    credential = _credential_digest(username, password)
+    session = user_sessions.get(username)
+    if session and hmac.compare_digest(session['credential'], credential):
+        msg_on_success = "Used cached session"
+        SESSION_LOOKUPS.inc('memory')
+    else:
+        session = await _restore_session(username, credential)
+        msg_on_success = "Used stored session"
+        SESSION_LOOKUPS.inc('store' if session else 'miss')
+
+    profile = await _load_profile(username)
+    fetch = sections
+    if 'personal_details' in profile:
+        fetch = (sections - {'personal_details'}) or frozenset({'summary'})
+
+    if session:
+        lnct = session['lnct']
+        data, msg = await lnct.get_attendance(_datewise_store_for(username, fetch), fetch)
+        if data:
+            # Writing the session back slides its expiry, here and in the store
+            user_sessions[username] = session
+            await _save_session(username, session)
+            await _update_profile(username, profile, session['name'], data, sections)
+            data['student_name'] = session['name']
+            return data, msg_on_success
+        if user_sessions.get(username, {}).get('lnct') is lnct:
+            del user_sessions[username]
+        await asyncio.to_thread(session_backend.delete, username)
+        await lnct.aclose()
+
+    lnct = AsyncLNCTAttendance()
+    result = await lnct.login(username, password, with_name='name' not in profile)
     ok = result[0]
     msg = result[1]
-    name = result[2] if len(result) > 2 else ""
+    name = profile.get('name') or (result[2] if len(result) > 2 else "")
     if not ok:
+        await lnct.aclose()
         raise HTTPException(status_code=401, detail=msg)
 
     user_sessions[username] = {
         'lnct': lnct,
         'name': name,
+        'credential': credential,
         'last_login': datetime.now()
     }
+    await _save_session(username, user_sessions[username])
 
-    data, msg = lnct.get_attendance()
+    data, msg = await lnct.get_attendance(_datewise_store_for(username, fetch), fetch)
     if not data:
         raise HTTPException(status_code=500, detail=msg)
     
+    await _update_profile(username, profile, name, data, sections)
     data['student_name'] = name
     return data, "Logged in and fetched"
 
@@ -311,114 +2158,297 @@ def _get_or_create_session(username, password):
 # FULL ATTENDANCE (UNCHANGED)
 # ==============================
 
+# Rows serialized per chunk written to a streamed response
+NDJSON_CHUNK_ROWS = 200
+
+
+def ndjson_response(summary, rows, headers=None):
+    """
+    Stream a summary line, then one line per (type, row) pair, then an end
+    line with the row count. Rows are serialized chunk by chunk as the
+    client reads, so the first line goes out before the history is encoded
+    and the full body never sits in memory at once.
+    """
+    def lines():
+        yield json.dumps({"type": "summary", **summary}, default=json_default) + "\n"
+        count = 0
+        chunk = []
+        for kind, row in rows:
+            chunk.append(json.dumps({"type": kind, **row}))
+            count += 1
+            if len(chunk) == NDJSON_CHUNK_ROWS:
+                yield "\n".join(chunk) + "\n"
+                chunk = []
+        if chunk:
+            yield "\n".join(chunk) + "\n"
+        yield json.dumps({"type": "end", "count": count}) + "\n"
+
+    # A plain generator is iterated in Starlette's threadpool, keeping the
+    # encoding work off the event loop.
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers=headers)
+
+
 @app.get("/attendance")
-def attendance(username: str = "", password: str = ""):
+async def attendance(request: Request, response: Response, username: str = "", password: str = "", since: Optional[int] = None, stream: bool = False):
+    """
+    Full attendance snapshot. Pass the previous response's
+    data.datewise_sync.version as `since` to receive only datewise rows
+    that changed after it; data.datewise_sync.full says whether the delta
+    could be used or the whole list was sent.
+    With `stream` the response is NDJSON: a summary line holding everything
+    but `datewise`, then one "datewise" line per row, then an "end" line.
+    """
+    if not username or not password:
+        raise HTTPException(status_code=400, detail="Username and password are required")
+
+    data, msg = await _get_or_create_session(username, password)
+    not_modified = check_etag(request, response, data)
+    if not_modified:
+        return not_modified
+    data['datewise'], data['datewise_sync'] = _datewise_since(username, data, since)
+    if stream:
+        datewise = data.pop('datewise')
+        return ndjson_response(
+            {"success": True, "message": msg, "data": data},
+            (("datewise", row) for row in datewise),
+            headers={'ETag': response.headers['etag']}
+        )
+    return {"success": True, "message": msg, "data": data}
+
+
+# ==============================
+# 🔥 NEW LITE ENDPOINT (ONLY ADDITION)
+# ==============================
+
+@app.get("/attendance-lite")
+async def attendance_lite(request: Request, response: Response, username: str = "", password: str = ""):
     if not username or not password:
         raise HTTPException(status_code=400, detail="Username and password are required")
 
-    cleanup_expired_sessions()
-    data, msg = _get_or_create_session(username, password)
-    return {"success": True, "message": msg, "data": data}
+    data, msg = await _get_or_create_session(username, password, {'summary'})
+    not_modified = check_etag(request, response, data)
+    if not_modified:
+        return not_modified
+
+    return {
+        "success": True,
+        "message": msg,
+        "snapshot": data["snapshot"],
+        "data": _lite_data(data)
+    }
+
+
+def _lite_data(data):
+    return {
+        "student_name": data.get("student_name", ""),
+        "total_classes": data["total_classes"],
+        "present": data["present"],
+        "absent": data["absent"],
+        "percentage": data["percentage"],
+        "overall_percentage": data["overall_percentage"],
+        "attended_classes": data["attended_classes"]
+    }
 
 
 # ==============================
-# 🔥 NEW LITE ENDPOINT (ONLY ADDITION)
+# BATCH ATTENDANCE
 # ==============================
 
-@app.get("/attendance-lite")
-def attendance_lite(username: str = "", password: str = ""):
-    if not username or not password:
-        raise HTTPException(status_code=400, detail="Username and password are required")
-
-    cleanup_expired_sessions()
-    data, msg = _get_or_create_session(username, password)
-
+# Portal logins one batch request may run at once, and its size limits
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "8"))
+BATCH_MAX_STUDENTS = int(os.environ.get("BATCH_MAX_STUDENTS", "200"))
+BATCH_STUDENT_TIMEOUT = float(os.environ.get("BATCH_STUDENT_TIMEOUT", "60"))
+
+
+class StudentCredentials(BaseModel):
+    username: str
+    password: str
+
+
+class BatchAttendanceRequest(BaseModel):
+    students: List[StudentCredentials]
+    concurrency: Optional[int] = None
+    full: bool = False
+
+
+async def _batch_student_result(index, student, semaphore, full):
+    result = {"index": index, "username": student.username}
+    if not student.username or not student.password:
+        return {**result, "success": False, "status": 400, "message": "Username and password are required"}
+    try:
+        async with semaphore:
+            data, msg = await asyncio.wait_for(
+                _get_or_create_session(student.username, student.password, ALL_SECTIONS if full else {'summary'}),
+                BATCH_STUDENT_TIMEOUT
+            )
+    except HTTPException as e:
+        return {**result, "success": False, "status": e.status_code, "message": e.detail}
+    except asyncio.TimeoutError:
+        return {**result, "success": False, "status": 504, "message": "Timed out waiting for the portal"}
+    except Exception as e:
+        logger.error(f"Batch fetch error for {student.username}: {e}")
+        return {**result, "success": False, "status": 500, "message": str(e)}
     return {
+        **result,
         "success": True,
         "message": msg,
-        "data": {
-            "student_name": data.get("student_name", ""),
-            "total_classes": data["total_classes"],
-            "present": data["present"],
-            "absent": data["absent"],
-            "percentage": data["percentage"],
-            "overall_percentage": data["overall_percentage"],
-            "attended_classes": data["attended_classes"]
-        }
+        "snapshot": data["snapshot"],
+        "data": data if full else _lite_data(data)
     }
 
 
+@app.post("/attendance/batch")
+async def attendance_batch(body: BatchAttendanceRequest):
+    """
+    Attendance for many students at once, for mentors and class
+    representatives. Students are scraped concurrently (at most
+    `concurrency`, capped by BATCH_CONCURRENCY) and each result is streamed
+    as one NDJSON line as soon as it is ready, tagged with its index in the
+    request. A final line summarises the batch. `full` returns the whole
+    /attendance payload instead of the /attendance-lite summary.
+    """
+    if not body.students:
+        raise HTTPException(status_code=400, detail="At least one student is required")
+    if len(body.students) > BATCH_MAX_STUDENTS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_STUDENTS} students per batch")
+
+    semaphore = asyncio.Semaphore(max(1, min(body.concurrency or BATCH_CONCURRENCY, BATCH_CONCURRENCY)))
+
+    async def stream():
+        tasks = [
+            asyncio.create_task(_batch_student_result(i, student, semaphore, body.full))
+            for i, student in enumerate(body.students)
+        ]
+        succeeded = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                result = await next_done
+                succeeded += result["success"]
+                yield json.dumps(result, default=json_default) + "\n"
+            yield json.dumps({"done": True, "succeeded": succeeded, "failed": len(tasks) - succeeded}) + "\n"
+        finally:
+            # Client went away: stop waiting on the remaining students
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
 # ==============================
 # ABSENT DATES ENDPOINT
 # ==============================
 
+def is_absent(record):
+    # Assuming status is 'Absent' or similar. Sometimes it is 'A' or 'Absent'
+    status = record.get('status', '').lower()
+    return 'absent' in status or status == 'a'
+
+def absent_month(record):
+    """Month an absence is grouped under, e.g. "April 2024"."""
+    month_key = "Unknown"
+    date_str = record.get('date', '')
+    
+    # Try to parse date string to get month and year
+    # Common formats: DD-MMM-YYYY, DD/MM/YYYY, DD MMM YYYY
+    try:
+        # Datewise rows parsed theirs when they were scraped
+        parsed_date = record.day if isinstance(record, DatewiseRow) else parse_portal_date(date_str)
+        
+        if parsed_date:
+            month_key = parsed_date.strftime("%B %Y") # e.g. "April 2024"
+        else:
+            # Fallback to simple string splitting if format is unknown
+            if '-' in date_str:
+                parts = date_str.split('-')
+                if len(parts) >= 2:
+                    month_key = f"{parts[1]}-{parts[2]}" if len(parts) == 3 else "-".join(parts[1:])
+            elif '/' in date_str:
+                parts = date_str.split('/')
+                if len(parts) >= 2:
+                    month_key = f"{parts[1]}/{parts[2]}" if len(parts) == 3 else "/".join(parts[1:])
+    except Exception:
+        pass
+    return month_key
+
+def group_absents_by_month(absents):
+    grouped_by_month = {}
+    for record in absents:
+        month_key = absent_month(record)
+            
+        if month_key not in grouped_by_month:
+            grouped_by_month[month_key] = []
+        grouped_by_month[month_key].append(record)
+    return grouped_by_month
+
 @app.get("/absent-dates")
-def get_absent_dates(username: str = "", password: str = ""):
+async def get_absent_dates(request: Request, response: Response, username: str = "", password: str = "",
+                           since: Optional[int] = None, stream: bool = False):
     """
     Returns all the dates where the student was absent.
     Includes both a flat list and a month-wise grouped dictionary.
+    With `since` (see /attendance) only absences recorded after that version
+    are listed, and `cleared` holds changed rows that are no longer absences.
+    With `stream` the response is NDJSON: a summary line, then one "absent"
+    line per absence carrying its `month` (and "cleared" lines for a delta),
+    then an "end" line.
     """
     if not username or not password:
         raise HTTPException(status_code=400, detail="Username and password are required")
 
-    cleanup_expired_sessions()
-    data, msg = _get_or_create_session(username, password)
+    data, msg = await _get_or_create_session(username, password, {'datewise'})
+    not_modified = check_etag(request, response, data)
+    if not_modified:
+        return not_modified
     
     if not data or 'datewise' not in data:
         raise HTTPException(status_code=500, detail="Failed to fetch datewise attendance data")
         
-    datewise = data.get('datewise', [])
-    absents = []
-    
-    for record in datewise:
-        # Assuming status is 'Absent' or similar. Sometimes it is 'A' or 'Absent'
-        status = record.get('status', '').lower()
-        if 'absent' in status or status == 'a':
-            absents.append(record)
-            
-    # Group by month
-    grouped_by_month = {}
-    for record in absents:
-        date_str = record.get('date', '')
-        month_key = "Unknown"
-        
-        # Try to parse date string to get month and year
-        # Common formats: DD-MMM-YYYY, DD/MM/YYYY, DD MMM YYYY
-        try:
-            parsed_date = None
-            for fmt in ("%d-%b-%Y", "%d/%m/%Y", "%d %b %Y", "%d-%m-%Y", "%d-%m-%y"):
-                try:
-                    parsed_date = datetime.strptime(date_str, fmt)
-                    break
-                except ValueError:
-                    continue
-            
-            if parsed_date:
-                month_key = parsed_date.strftime("%B %Y") # e.g. "April 2024"
-            else:
-                # Fallback to simple string splitting if format is unknown
-                if '-' in date_str:
-                    parts = date_str.split('-')
-                    if len(parts) >= 2:
-                        month_key = f"{parts[1]}-{parts[2]}" if len(parts) == 3 else "-".join(parts[1:])
-                elif '/' in date_str:
-                    parts = date_str.split('/')
-                    if len(parts) >= 2:
-                        month_key = f"{parts[1]}/{parts[2]}" if len(parts) == 3 else "/".join(parts[1:])
-        except Exception:
-            pass
+    datewise, datewise_sync = _datewise_since(username, data, since)
+    with ANALYSIS_SECONDS.time('absent-dates'):
+        bundle = get_analytics(data)
+        absents = bundle.absents
+        cleared = []
+
+        if not datewise_sync['full']:
+            absents = []
+            for record in datewise:
+                if is_absent(record):
+                    absents.append(record)
+                else:
+                    cleared.append(record)
+
+    total_absents = len(bundle.absents)
+
+    if stream:
+        rows = itertools.chain(
+            (("absent", {"month": absent_month(record), **record}) for record in absents),
+            (("cleared", record) for record in cleared)
+        )
+        return ndjson_response(
+            {"success": True, "snapshot": data["snapshot"],
+             "data": {"total_absents": total_absents, "datewise_sync": datewise_sync}},
+            rows,
+            headers={'ETag': response.headers['etag']}
+        )
             
-        if month_key not in grouped_by_month:
-            grouped_by_month[month_key] = []
-        grouped_by_month[month_key].append(record)
+    if datewise_sync['full']:
+        grouped_by_month = bundle.monthwise_absents
+    else:
+        grouped_by_month = group_absents_by_month(absents)
+
+    result = {
+        "total_absents": total_absents,
+        "absents": absents,
+        "monthwise_absents": grouped_by_month
+    }
+    if not datewise_sync['full']:
+        result["cleared"] = cleared
+    result["datewise_sync"] = datewise_sync
 
     return {
         "success": True,
-        "data": {
-            "total_absents": len(absents),
-            "absents": absents,
-            "monthwise_absents": grouped_by_month
-        }
+        "snapshot": data["snapshot"],
+        "data": result
     }
 
 
@@ -476,7 +2506,7 @@ TIMETABLE_DATA = {
 }
 
 @app.get("/timetable")
-def get_timetable():
+async def get_timetable():
     """Returns the weekly timetable"""
     return {"success": True, "data": TIMETABLE_DATA}
 
@@ -486,30 +2516,92 @@ def normalize_subject(name):
     return name.strip()
 
 
+def subject_key(name):
+    """
+    Key two subject names are matched on. Matching is EXACT apart from case
+    and surrounding whitespace, so Theory (-T) and Practical (-P) stay separate.
+    """
+    return name.strip().upper()
+
+
 def subjects_match(name1, name2):
+    """Check if two subject names refer to the same subject."""
+    return subject_key(name1) == subject_key(name2)
+
+
+def get_class_units(time_str):
+    """Calculate class units based on time duration (labs = 2 units, regular = 1 unit)"""
+    try:
+        start, end = time_str.split('-')
+        start_h, start_m = map(int, start.split(':'))
+        end_h, end_m = map(int, end.split(':'))
+        duration_minutes = (end_h * 60 + end_m) - (start_h * 60 + start_m)
+        # Labs are typically 90+ minutes and count as 2 class units
+        return 2 if duration_minutes >= 80 else 1
+    except:
+        return 1
+
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+NON_CLASS_PERIODS = {'LUNCH', 'Lunch Break'}
+
+
+class TimetableIndex:
     """
-    Check if two subject names refer to the same subject.
-    Uses EXACT matching to treat Theory (-T) and Practical (-P) as separate subjects.
+    TIMETABLE_DATA compiled once so the analysis endpoints look subjects up
+    by subject_key() instead of rescanning every period of every day.
     """
-    # Exact match
-    if name1.strip() == name2.strip():
-        return True
-    
-    # Case-insensitive exact match
-    if name1.strip().upper() == name2.strip().upper():
-        return True
-    
-    return False
+
+    def __init__(self, timetable):
+        self.days = list(timetable)
+        self.day_subjects = {}   # day -> timetable subject names, lunch excluded
+        self.day_periods = {}    # day -> {subject key: periods}
+        self.day_units = {}      # day -> {subject key: class units}
+        self.day_totals = {}     # day -> class units
+        self.names = {}          # subject key -> timetable spellings
+        for day, periods in timetable.items():
+            subjects = [p['subject'] for p in periods if p['subject'] not in NON_CLASS_PERIODS]
+            period_counts = {}
+            units = {}
+            for p in periods:
+                if p['subject'] in NON_CLASS_PERIODS:
+                    continue
+                key = subject_key(p['subject'])
+                period_counts[key] = period_counts.get(key, 0) + 1
+                units[key] = units.get(key, 0) + get_class_units(p['time'])
+                spellings = self.names.setdefault(key, [])
+                if p['subject'] not in spellings:
+                    spellings.append(p['subject'])
+            self.day_subjects[day] = subjects
+            self.day_periods[day] = period_counts
+            self.day_units[day] = units
+            self.day_totals[day] = sum(units.values())
+        self.week_total = sum(self.day_totals.get(day, 0) for day in WEEKDAYS)
+
+    def units_on(self, day, subject_name):
+        return self.day_units.get(day, {}).get(subject_key(subject_name), 0)
+
+
+timetable_index = TimetableIndex(TIMETABLE_DATA)
+
+
+def set_timetable(timetable):
+    """Replace the timetable and recompile its index."""
+    global TIMETABLE_DATA, timetable_index
+    TIMETABLE_DATA = timetable
+    timetable_index = TimetableIndex(timetable)
 
 
 @app.get("/debug-subjects")
-def debug_subjects(username: str = "", password: str = ""):
+async def debug_subjects(request: Request, response: Response, username: str = "", password: str = ""):
     """Debug endpoint to see actual subject names and matching"""
     if not username or not password:
         raise HTTPException(status_code=400, detail="Username and password are required")
     
-    cleanup_expired_sessions()
-    data, msg = _get_or_create_session(username, password)
+    data, msg = await _get_or_create_session(username, password, {'subjects'})
+    not_modified = check_etag(request, response, data)
+    if not_modified:
+        return not_modified
     
     if not data or 'subjects' not in data:
         raise HTTPException(status_code=500, detail="Failed to fetch attendance data")
@@ -517,19 +2609,13 @@ def debug_subjects(username: str = "", password: str = ""):
     subjects = data.get('subjects', [])
     
     # Get all unique timetable subjects
-    timetable_subjects = set()
-    for day, periods in TIMETABLE_DATA.items():
-        for p in periods:
-            if p['subject'] not in ['LUNCH', 'Lunch Break']:
-                timetable_subjects.add(p['subject'])
+    index = timetable_index
+    timetable_subjects = [name for names in index.names.values() for name in names]
     
     # Check matching
     matching_report = []
     for subj in subjects:
-        matches = []
-        for tt_subj in timetable_subjects:
-            if subjects_match(subj['name'], tt_subj):
-                matches.append(tt_subj)
+        matches = index.names.get(subject_key(subj['name']), [])
         
         matching_report.append({
             'attendance_subject': subj['name'],
@@ -540,6 +2626,7 @@ def debug_subjects(username: str = "", password: str = ""):
     
     return {
         "success": True,
+        "snapshot": data["snapshot"],
         "data": {
             "attendance_subjects": [s['name'] for s in subjects],
             "timetable_subjects": list(timetable_subjects),
@@ -593,29 +2680,97 @@ def calculate_risk_metrics(subj, threshold=75.0):
     }
 
 
-@app.get("/risk-engine")
-def get_risk_engine(username: str = "", password: str = "", threshold: float = 75.0):
+# ==============================
+# ANALYTICS BUNDLE
+# ==============================
+
+ANALYTICS_CACHE_TTL = float(os.environ.get("ANALYTICS_CACHE_TTL", "600"))
+# The threshold the endpoints default to; views for any other are not kept
+DEFAULT_THRESHOLD = 75.0
+
+
+class AnalyticsBundle:
     """
-    Attendance Risk Engine - Detailed risk analysis
+    Everything the analysis endpoints derive from one snapshot: overall
+    totals, absences grouped by month, and, on first use, risk metrics and
+    each endpoint's finished view. Built once per snapshot
+    content, so /analysis, /risk-engine, the leave simulators and
+    /absent-dates only slice it. Views are shared; never mutate them.
     """
-    if not username or not password:
-        raise HTTPException(status_code=400, detail="Username and password are required")
 
-    cleanup_expired_sessions()
-    data, msg = _get_or_create_session(username, password)
-    
-    if not data or 'subjects' not in data:
-        raise HTTPException(status_code=500, detail="Failed to fetch attendance data")
-    
-    subjects = data.get('subjects', [])
+    def __init__(self, data):
+        self.subjects = data.get('subjects', [])
+        self.total_classes = sum(s['total'] for s in self.subjects)
+        self.total_present = sum(s['present'] for s in self.subjects)
+        self.overall_percentage = round((self.total_present / self.total_classes) * 100, 2) if self.total_classes > 0 else 0
+        self.absents = [record for record in data.get('datewise', []) if is_absent(record)]
+        self.monthwise_absents = group_absents_by_month(self.absents)
+        self.views = {}
+        self.risk_metrics(DEFAULT_THRESHOLD)
+
+    def view(self, key, build):
+        # Two requests may both build a missing view; the results are equal
+        # and the last one wins, so no lock is needed.
+        view = self.views.get(key)
+        if view is None:
+            view = self.views[key] = build()
+        return view
+
+    def threshold_view(self, name, threshold, build):
+        """
+        view() for a view that depends on the caller's threshold. Only the
+        default threshold's is kept: the threshold comes from the query
+        string, and keeping one view per value would grow the bundle without
+        bound. Any other threshold is built per request.
+        """
+        if threshold != DEFAULT_THRESHOLD:
+            return build()
+        return self.view((name, DEFAULT_THRESHOLD), build)
+
+    def risk_metrics(self, threshold):
+        """calculate_risk_metrics() for every subject, in subject order."""
+        return self.threshold_view('risk_metrics', threshold,
+                                   lambda: [calculate_risk_metrics(s, threshold) for s in self.subjects])
+
+    def classify(self, threshold):
+        """(at risk, safe) subjects; at risk ascending, safe descending by percentage."""
+        def build():
+            at_risk = sorted((s for s in self.subjects if s.get('percentage', 0) < threshold), key=lambda x: x['percentage'])
+            safe = sorted((s for s in self.subjects if s.get('percentage', 0) >= threshold), key=lambda x: x['percentage'], reverse=True)
+            return at_risk, safe
+        return self.threshold_view('classify', threshold, build)
+
+
+# Bundles are keyed by snapshot content hash: a re-scrape that finds
+# nothing new, or two students with identical data, reuse the same one.
+analytics_cache = TTLCache(maxsize=SNAPSHOT_CACHE_MAXSIZE, ttl=ANALYTICS_CACHE_TTL)
+analytics_cache_lock = threading.Lock()
+
+
+def get_analytics(data):
+    content_hash = data['snapshot']['content_hash'] if 'snapshot' in data else snapshot_content_hash(data)
+    return build_analytics(data, content_hash)
+
+
+def build_analytics(data, content_hash):
+    with analytics_cache_lock:
+        bundle = analytics_cache.get(content_hash)
+    if bundle is None:
+        bundle = AnalyticsBundle(data)
+        with analytics_cache_lock:
+            analytics_cache[content_hash] = bundle
+    return bundle
+
+
+def build_risk_view(bundle, threshold):
+    subjects = bundle.subjects
     
     # Find lowest attendance subject
     lowest_subject = min(subjects, key=lambda x: x['percentage']) if subjects else None
     
     # Calculate risk metrics for all subjects
     risk_analysis = []
-    for subj in subjects:
-        metrics = calculate_risk_metrics(subj, threshold)
+    for subj, metrics in zip(subjects, bundle.risk_metrics(threshold)):
         risk_level = 'CRITICAL' if subj['percentage'] < 65 else ('HIGH' if subj['percentage'] < threshold else 'LOW')
         
         risk_analysis.append({
@@ -639,65 +2794,51 @@ def get_risk_engine(username: str = "", password: str = "", threshold: float = 7
     at_risk_count = sum(1 for r in risk_analysis if r['risk_level'] in ['CRITICAL', 'HIGH'])
     
     return {
-        "success": True,
-        "data": {
-            "threshold": threshold,
-            "lowest_attendance_subject": lowest_subject,
-            "overall_risk_status": 'DANGER' if at_risk_count >= 3 else ('WARNING' if at_risk_count >= 1 else 'SAFE'),
-            "at_risk_subjects_count": at_risk_count,
-            "subject_risks": risk_analysis,
-            "critical_alert": any(r['risk_level'] == 'CRITICAL' for r in risk_analysis)
-        }
+        "threshold": threshold,
+        "lowest_attendance_subject": lowest_subject,
+        "overall_risk_status": 'DANGER' if at_risk_count >= 3 else ('WARNING' if at_risk_count >= 1 else 'SAFE'),
+        "at_risk_subjects_count": at_risk_count,
+        "subject_risks": risk_analysis,
+        "critical_alert": any(r['risk_level'] == 'CRITICAL' for r in risk_analysis)
     }
 
 
-@app.get("/leave-simulator")
-def simulate_leave(username: str = "", password: str = "", day: str = ""):
+@app.get("/risk-engine")
+async def get_risk_engine(request: Request, response: Response, username: str = "", password: str = "", threshold: float = 75.0):
     """
-    Leave Simulation Engine - Simulate missing classes on a specific day
+    Attendance Risk Engine - Detailed risk analysis
     """
     if not username or not password:
         raise HTTPException(status_code=400, detail="Username and password are required")
-    
-    if not day or day not in TIMETABLE_DATA:
-        raise HTTPException(status_code=400, detail=f"Valid day required. Options: {', '.join(TIMETABLE_DATA.keys())}")
 
-    cleanup_expired_sessions()
-    data, msg = _get_or_create_session(username, password)
+    data, msg = await _get_or_create_session(username, password, {'subjects'})
+    not_modified = check_etag(request, response, data)
+    if not_modified:
+        return not_modified
     
     if not data or 'subjects' not in data:
         raise HTTPException(status_code=500, detail="Failed to fetch attendance data")
     
-    subjects = data.get('subjects', [])
-    periods = TIMETABLE_DATA.get(day, [])
-    
-    # Calculate class units based on duration (labs = 2 units, regular = 1 unit)
-    def get_class_units(time_str):
-        """Calculate class units based on time duration"""
-        try:
-            start, end = time_str.split('-')
-            start_h, start_m = map(int, start.split(':'))
-            end_h, end_m = map(int, end.split(':'))
-            duration_minutes = (end_h * 60 + end_m) - (start_h * 60 + start_m)
-            # Labs are typically 90+ minutes and count as 2 class units
-            return 2 if duration_minutes >= 80 else 1
-        except:
-            return 1
-    
-    # Build list of subjects with their class units for this day
-    day_subjects_with_units = []
-    for p in periods:
-        if p['subject'] not in ['LUNCH', 'Lunch Break']:
-            units = get_class_units(p['time'])
-            day_subjects_with_units.append({'subject': p['subject'], 'units': units})
+    with ANALYSIS_SECONDS.time('risk-engine'):
+        bundle = get_analytics(data)
+        view = bundle.threshold_view('risk-engine', threshold, lambda: build_risk_view(bundle, threshold))
+    return {
+        "success": True,
+        "snapshot": data["snapshot"],
+        "data": view
+    }
+
+
+def build_leave_day_view(bundle, day, index):
+    subjects = bundle.subjects
     
-    # Calculate total class units for display
-    total_class_units = sum(s['units'] for s in day_subjects_with_units)
+    # Class units per subject for this day (labs = 2 units, regular = 1 unit)
+    total_class_units = index.day_totals[day]
     
-    # Calculate current overall attendance
-    current_total_classes = sum(s['total'] for s in subjects)
-    current_present = sum(s['present'] for s in subjects)
-    current_overall_percentage = round((current_present / current_total_classes) * 100, 2) if current_total_classes > 0 else 0
+    # Current overall attendance
+    current_total_classes = bundle.total_classes
+    current_present = bundle.total_present
+    current_overall_percentage = bundle.overall_percentage
     
     # Simulate the impact
     simulation_results = []
@@ -709,10 +2850,7 @@ def simulate_leave(username: str = "", password: str = "", day: str = ""):
         subj_name = subj['name']
         
         # Count how many class units of this subject are on this day
-        classes_on_day = 0
-        for item in day_subjects_with_units:
-            if subjects_match(subj_name, item['subject']):
-                classes_on_day += item['units']
+        classes_on_day = index.units_on(day, subj_name)
         
         if classes_on_day > 0:
             affected_subjects.add(subj_name)
@@ -769,86 +2907,76 @@ def simulate_leave(username: str = "", password: str = "", day: str = ""):
     overall_percentage_drop = round(current_overall_percentage - projected_overall_percentage, 2)
     
     return {
-        "success": True,
-        "data": {
-            "simulated_day": day,
-            "total_classes_on_day": total_class_units,
-            "affected_subjects_count": len(simulation_results),
-            "recommendation": recommendation,
-            "advice": advice,
-            "total_impact_score": total_impact_score,
-            "subject_simulations": simulation_results,
-            "subjects_not_affected": [s['name'] for s in subjects if s['name'] not in affected_subjects],
-            "overall_attendance": {
-                "current": current_overall_percentage,
-                "projected": projected_overall_percentage,
-                "drop": overall_percentage_drop
-            }
+        "simulated_day": day,
+        "total_classes_on_day": total_class_units,
+        "affected_subjects_count": len(simulation_results),
+        "recommendation": recommendation,
+        "advice": advice,
+        "total_impact_score": total_impact_score,
+        "subject_simulations": simulation_results,
+        "subjects_not_affected": [s['name'] for s in subjects if s['name'] not in affected_subjects],
+        "overall_attendance": {
+            "current": current_overall_percentage,
+            "projected": projected_overall_percentage,
+            "drop": overall_percentage_drop
         }
     }
 
 
-@app.get("/analysis")
-def get_attendance_analysis(username: str = "", password: str = ""):
+@app.get("/leave-simulator")
+async def simulate_leave(request: Request, response: Response, username: str = "", password: str = "", day: str = ""):
     """
-    Returns detailed analysis including:
-    - Subject-wise attendance status
-    - Which subjects are at risk (< 75%)
-    - Best days to take leave (days with low-attendance subjects)
-    - Days to avoid (days with high-attendance subjects)
+    Leave Simulation Engine - Simulate missing classes on a specific day
     """
     if not username or not password:
         raise HTTPException(status_code=400, detail="Username and password are required")
+    
+    if not day or day not in TIMETABLE_DATA:
+        raise HTTPException(status_code=400, detail=f"Valid day required. Options: {', '.join(TIMETABLE_DATA.keys())}")
 
-    cleanup_expired_sessions()
-    data, msg = _get_or_create_session(username, password)
+    data, msg = await _get_or_create_session(username, password, {'subjects'})
+    not_modified = check_etag(request, response, data)
+    if not_modified:
+        return not_modified
     
     if not data or 'subjects' not in data:
         raise HTTPException(status_code=500, detail="Failed to fetch attendance data")
     
-    subjects = data.get('subjects', [])
+    index = timetable_index
+    with ANALYSIS_SECONDS.time('leave-simulator'):
+        bundle = get_analytics(data)
+        view = bundle.view(('leave-simulator', day, index), lambda: build_leave_day_view(bundle, day, index))
+    return {
+        "success": True,
+        "snapshot": data["snapshot"],
+        "data": view
+    }
+
+
+def build_analysis_view(bundle, index):
+    subjects = bundle.subjects
     
     # Categorize subjects by attendance
-    at_risk = []  # < 75%
+    at_risk, safe = bundle.classify(75)
     moderate = []  # Not used with binary threshold
-    safe = []  # >= 75%
-    
-    for subj in subjects:
-        pct = subj.get('percentage', 0)
-        if pct < 75:
-            at_risk.append(subj)
-        else:
-            safe.append(subj)
-    
-    # Sort by percentage (ascending for at_risk, descending for safe)
-    at_risk.sort(key=lambda x: x['percentage'])
-    moderate.sort(key=lambda x: x['percentage'])
-    safe.sort(key=lambda x: x['percentage'], reverse=True)
     
     # Analyze timetable to find best/worst days for leave
+    at_risk_keys = {subject_key(s['name']) for s in at_risk}
+    safe_keys = {subject_key(s['name']) for s in safe}
     day_analysis = {}
-    for day, periods in TIMETABLE_DATA.items():
-        # Filter out lunch and non-academic periods
-        day_subjects_raw = [p['subject'] for p in periods if p['subject'] not in ['LUNCH', 'Lunch Break']]
+    for day in index.days:
+        # Lunch and non-academic periods are already filtered out
+        day_subjects_raw = index.day_subjects[day]
         
         # Count at-risk and safe subjects for this day
         at_risk_count = 0
         safe_count = 0
         
-        for timetable_subj in day_subjects_raw:
-            # Check if this timetable subject matches any at-risk subject
-            matched_at_risk = False
-            for r in at_risk:
-                if subjects_match(r['name'], timetable_subj):
-                    at_risk_count += 1
-                    matched_at_risk = True
-                    break
-            
-            if not matched_at_risk:
-                for saf in safe:
-                    if subjects_match(saf['name'], timetable_subj):
-                        safe_count += 1
-                        break
+        for key, periods in index.day_periods[day].items():
+            if key in at_risk_keys:
+                at_risk_count += periods
+            elif key in safe_keys:
+                safe_count += periods
         
         day_analysis[day] = {
             'subjects': day_subjects_raw,
@@ -860,13 +2988,9 @@ def get_attendance_analysis(username: str = "", password: str = ""):
     
     # Calculate how many classes can be missed per subject to maintain 75%
     predictions = []
-    for subj in subjects:
-        total = subj.get('total', 0)
-        present = subj.get('present', 0)
+    for subj, metrics in zip(subjects, bundle.risk_metrics(75.0)):
         pct = subj.get('percentage', 0)
         
-        metrics = calculate_risk_metrics(subj)
-        
         if pct < 75:
             predictions.append({
                 'subject': subj['name'],
@@ -885,10 +3009,7 @@ def get_attendance_analysis(username: str = "", password: str = ""):
                 'message': f"Can miss {metrics['absents_allowed']} classes and maintain 75%"
             })
     
-    # Calculate overall attendance
-    total_classes = sum(s['total'] for s in subjects)
-    total_present = sum(s['present'] for s in subjects)
-    overall_percentage = round((total_present / total_classes) * 100, 2) if total_classes > 0 else 0
+    overall_percentage = bundle.overall_percentage
     
     # Determine overall status message
     if overall_percentage >= 75:
@@ -902,73 +3023,67 @@ def get_attendance_analysis(username: str = "", password: str = ""):
         overall_message = "Your attendance is very low! Attend classes regularly."
     
     return {
-        "success": True,
-        "data": {
-            "summary": {
-                "total_subjects": len(subjects),
-                "at_risk_count": len(at_risk),
-                "moderate_count": len(moderate),
-                "safe_count": len(safe),
-                "overall_percentage": overall_percentage,
-                "overall_status": overall_status,
-                "overall_message": overall_message
-            },
-            "at_risk_subjects": at_risk,
-            "moderate_subjects": moderate,
-            "safe_subjects": safe,
-            "day_analysis": day_analysis,
-            "predictions": predictions
-        }
+        "summary": {
+            "total_subjects": len(subjects),
+            "at_risk_count": len(at_risk),
+            "moderate_count": len(moderate),
+            "safe_count": len(safe),
+            "overall_percentage": overall_percentage,
+            "overall_status": overall_status,
+            "overall_message": overall_message
+        },
+        "at_risk_subjects": at_risk,
+        "moderate_subjects": moderate,
+        "safe_subjects": safe,
+        "day_analysis": day_analysis,
+        "predictions": predictions
     }
 
 
-@app.get("/leave-simulator-week")
-def simulate_leave_week(username: str = "", password: str = ""):
+@app.get("/analysis")
+async def get_attendance_analysis(request: Request, response: Response, username: str = "", password: str = ""):
     """
-    Leave Simulation Engine - Simulate missing classes for the whole week
-    Returns impact analysis for each day (Monday-Friday)
+    Returns detailed analysis including:
+    - Subject-wise attendance status
+    - Which subjects are at risk (< 75%)
+    - Best days to take leave (days with low-attendance subjects)
+    - Days to avoid (days with high-attendance subjects)
     """
     if not username or not password:
         raise HTTPException(status_code=400, detail="Username and password are required")
-    
-    cleanup_expired_sessions()
-    data, msg = _get_or_create_session(username, password)
+
+    data, msg = await _get_or_create_session(username, password, {'subjects'})
+    not_modified = check_etag(request, response, data)
+    if not_modified:
+        return not_modified
     
     if not data or 'subjects' not in data:
         raise HTTPException(status_code=500, detail="Failed to fetch attendance data")
     
-    subjects = data.get('subjects', [])
-    
-    # Calculate current overall attendance
-    current_total_classes = sum(s['total'] for s in subjects)
-    current_present = sum(s['present'] for s in subjects)
-    current_overall_percentage = round((current_present / current_total_classes) * 100, 2) if current_total_classes > 0 else 0
+    index = timetable_index
+    with ANALYSIS_SECONDS.time('analysis'):
+        bundle = get_analytics(data)
+        view = bundle.view(('analysis', index), lambda: build_analysis_view(bundle, index))
+    return {
+        "success": True,
+        "snapshot": data["snapshot"],
+        "data": view
+    }
+
+
+def build_leave_week_view(bundle, index):
+    subjects = bundle.subjects
     
-    # Calculate class units based on duration
-    def get_class_units(time_str):
-        try:
-            start, end = time_str.split('-')
-            start_h, start_m = map(int, start.split(':'))
-            end_h, end_m = map(int, end.split(':'))
-            duration_minutes = (end_h * 60 + end_m) - (start_h * 60 + start_m)
-            return 2 if duration_minutes >= 80 else 1
-        except:
-            return 1
+    # Current overall attendance
+    current_total_classes = bundle.total_classes
+    current_present = bundle.total_present
+    current_overall_percentage = bundle.overall_percentage
     
-    days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
+    days = WEEKDAYS
     week_simulation = []
     
     for day in days:
-        periods = TIMETABLE_DATA.get(day, [])
-        
-        # Build list of subjects with their class units
-        day_subjects_with_units = []
-        for p in periods:
-            if p['subject'] not in ['LUNCH', 'Lunch Break']:
-                units = get_class_units(p['time'])
-                day_subjects_with_units.append({'subject': p['subject'], 'units': units})
-        
-        total_class_units = sum(s['units'] for s in day_subjects_with_units)
+        total_class_units = index.day_totals.get(day, 0)
         
         # Simulate impact for this day
         simulation_results = []
@@ -978,10 +3093,7 @@ def simulate_leave_week(username: str = "", password: str = ""):
         for subj in subjects:
             subj_name = subj['name']
             
-            classes_on_day = 0
-            for item in day_subjects_with_units:
-                if subjects_match(subj_name, item['subject']):
-                    classes_on_day += item['units']
+            classes_on_day = index.units_on(day, subj_name)
             
             if classes_on_day > 0:
                 new_total = subj['total'] + classes_on_day
@@ -1042,12 +3154,7 @@ def simulate_leave_week(username: str = "", password: str = ""):
         })
     
     # Calculate whole week leave impact using raw timetable data (not affected subjects)
-    total_week_absences = 0
-    for day in days:
-        periods = TIMETABLE_DATA.get(day, [])
-        for p in periods:
-            if p['subject'] not in ['LUNCH', 'Lunch Break']:
-                total_week_absences += get_class_units(p['time'])
+    total_week_absences = index.week_total
     
     projected_total_week = current_total_classes + total_week_absences
     projected_pct_week = round((current_present / projected_total_week) * 100, 2) if projected_total_week > 0 else 0
@@ -1056,45 +3163,337 @@ def simulate_leave_week(username: str = "", password: str = ""):
     day_order = {'Monday': 0, 'Tuesday': 1, 'Wednesday': 2, 'Thursday': 3, 'Friday': 4}
     week_simulation.sort(key=lambda x: day_order.get(x['day'], 5))
     
+    return {
+        "current_overall_percentage": current_overall_percentage,
+        "week_simulation": week_simulation,
+        "whole_week_leave": {
+            "total_absences": total_week_absences,
+            "projected_overall_percentage": projected_pct_week,
+            "overall_drop": round(current_overall_percentage - projected_pct_week, 2)
+        }
+    }
+
+
+@app.get("/leave-simulator-week")
+async def simulate_leave_week(request: Request, response: Response, username: str = "", password: str = ""):
+    """
+    Leave Simulation Engine - Simulate missing classes for the whole week
+    Returns impact analysis for each day (Monday-Friday)
+    """
+    if not username or not password:
+        raise HTTPException(status_code=400, detail="Username and password are required")
+    
+    data, msg = await _get_or_create_session(username, password, {'subjects'})
+    not_modified = check_etag(request, response, data)
+    if not_modified:
+        return not_modified
+    
+    if not data or 'subjects' not in data:
+        raise HTTPException(status_code=500, detail="Failed to fetch attendance data")
+    
+    index = timetable_index
+    with ANALYSIS_SECONDS.time('leave-simulator-week'):
+        bundle = get_analytics(data)
+        view = bundle.view(('leave-simulator-week', index), lambda: build_leave_week_view(bundle, index))
     return {
         "success": True,
-        "data": {
-            "current_overall_percentage": current_overall_percentage,
-            "week_simulation": week_simulation,
-            "whole_week_leave": {
-                "total_absences": total_week_absences,
-                "projected_overall_percentage": projected_pct_week,
-                "overall_drop": round(current_overall_percentage - projected_pct_week, 2)
+        "snapshot": data["snapshot"],
+        "data": view
+    }
+
+
+# ==============================
+# LEAVE PLANNER
+# ==============================
+
+# Upper bound on the leave combinations scored in one request
+LEAVE_PLAN_MAX_CANDIDATES = int(os.environ.get("LEAVE_PLAN_MAX_CANDIDATES", "500000"))
+LEAVE_PLAN_CHUNK = 50000
+
+
+def _leave_candidates(n_days, leaves, consecutive):
+    """Candidate plans as an (n_candidates, leaves) array of class-day indices."""
+    import numpy as np
+    if consecutive:
+        return np.arange(n_days - leaves + 1)[:, None] + np.arange(leaves)
+    count = math.comb(n_days, leaves)
+    flat = itertools.chain.from_iterable(itertools.combinations(range(n_days), leaves))
+    return np.fromiter(flat, dtype=np.int32, count=count * leaves).reshape(count, leaves)
+
+
+def plan_leaves(subjects, dates, leaves, threshold=75.0, consecutive=False, top=10, index=None):
+    """
+    Score every way of skipping `leaves` class days among `dates`, assuming
+    every other class in the window is attended. Subjects x days are held as
+    a NumPy units matrix, so each chunk of candidates is one gather-and-sum.
+    Plans are ranked by their lowest projected subject percentage, then by
+    projected overall percentage.
+    """
+    # NumPy is only needed here; importing it on first use keeps it off cold starts
+    import numpy as np
+    index = index or timetable_index
+    class_dates = [d for d in dates if index.day_totals.get(d.strftime('%A'), 0) > 0]
+    n_days = len(class_dates)
+    if leaves < 1 or leaves > n_days:
+        raise ValueError(f"leaves must be between 1 and the {n_days} class days in the range")
+    n_candidates = n_days - leaves + 1 if consecutive else math.comb(n_days, leaves)
+    if n_candidates > LEAVE_PLAN_MAX_CANDIDATES:
+        raise ValueError(f"{n_candidates} combinations to score; narrow the date range or plan fewer leaves")
+
+    # units[d, s]: class units of subject s on class day d
+    keys = [subject_key(s['name']) for s in subjects]
+    weekday_units = {
+        day: np.array([units.get(key, 0) for key in keys], dtype=np.int32)
+        for day, units in index.day_units.items()
+    }
+    units = np.stack([weekday_units[d.strftime('%A')] for d in class_dates])
+    present = np.array([s['present'] for s in subjects], dtype=np.float64)
+    total = np.array([s['total'] for s in subjects], dtype=np.float64)
+
+    # Attend everything, then subtract what each plan misses
+    attend_all = present + units.sum(axis=0)
+    window_total = total + units.sum(axis=0)
+    # Subjects with no classes at all can't be put at risk
+    counted = window_total > 0
+    if not counted.any():
+        raise ValueError("no subjects with classes to plan leaves around")
+    safe_total = np.where(counted, window_total, 1)
+    grand_total = window_total.sum()
+
+    candidates = _leave_candidates(n_days, leaves, consecutive)
+    lowest = np.empty(len(candidates))
+    overall = np.empty(len(candidates))
+    for start in range(0, len(candidates), LEAVE_PLAN_CHUNK):
+        chunk = candidates[start:start + LEAVE_PLAN_CHUNK]
+        missed = units[chunk].sum(axis=1)
+        pct = (attend_all - missed) / safe_total * 100
+        lowest[start:start + len(chunk)] = np.where(counted, pct, np.inf).min(axis=1)
+        overall[start:start + len(chunk)] = (attend_all.sum() - missed.sum(axis=1)) / grand_total * 100
+
+    order = np.lexsort((-overall, -lowest))[:top]
+    plans = []
+    for i in order:
+        chunk_days = candidates[i]
+        missed = units[chunk_days].sum(axis=0)
+        pct = (attend_all - missed) / safe_total * 100
+        subject_results = [
+            {
+                'subject': subj['name'],
+                'classes_missed': int(missed[s]),
+                'projected_percentage': round(float(pct[s]), 2)
             }
+            for s, subj in enumerate(subjects) if counted[s]
+        ]
+        subject_results.sort(key=lambda x: x['projected_percentage'])
+        plans.append({
+            'dates': [class_dates[d].isoformat() for d in chunk_days],
+            'days': [class_dates[d].strftime('%A') for d in chunk_days],
+            'classes_missed': int(missed.sum()),
+            'lowest_subject': subject_results[0]['subject'] if subject_results else None,
+            'lowest_percentage': round(float(lowest[i]), 2),
+            'projected_overall_percentage': round(float(overall[i]), 2),
+            'stays_above_threshold': bool(lowest[i] >= threshold),
+            'subjects': subject_results
+        })
+
+    return {
+        'class_days_in_range': n_days,
+        'candidates_evaluated': len(candidates),
+        'plans_above_threshold': int((lowest >= threshold).sum()),
+        'if_no_leave': {
+            'lowest_percentage': round(float(np.where(counted, attend_all / safe_total * 100, np.inf).min()), 2),
+            'projected_overall_percentage': round(float(attend_all.sum() / grand_total * 100), 2)
+        },
+        'plans': plans
+    }
+
+
+@app.get("/leave-planner")
+async def plan_leave(request: Request, response: Response, username: str = "", password: str = "", leaves: int = 1,
+                     start: str = "", end: str = "", threshold: float = 75.0,
+                     consecutive: bool = False, top: int = 10):
+    """
+    Leave Planner - Find the best `leaves` days to skip between `start` and
+    `end` (YYYY-MM-DD, default the next 30 days). With `consecutive` only
+    back-to-back class days are considered.
+    """
+    if not username or not password:
+        raise HTTPException(status_code=400, detail="Username and password are required")
+
+    try:
+        start_date = date.fromisoformat(start) if start else date.today() + timedelta(days=1)
+        end_date = date.fromisoformat(end) if end else start_date + timedelta(days=29)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="start and end must be dates in YYYY-MM-DD format")
+    if end_date < start_date or (end_date - start_date).days > 366:
+        raise HTTPException(status_code=400, detail="end must be after start and at most a year later")
+
+    data, msg = await _get_or_create_session(username, password, {'subjects'})
+    not_modified = check_etag(request, response, data)
+    if not_modified:
+        return not_modified
+    
+    if not data or 'subjects' not in data:
+        raise HTTPException(status_code=500, detail="Failed to fetch attendance data")
+
+    dates = [start_date + timedelta(days=i) for i in range((end_date - start_date).days + 1)]
+    try:
+        with ANALYSIS_SECONDS.time('leave-planner'):
+            result = await asyncio.to_thread(
+                plan_leaves, data.get('subjects', []), dates, leaves, threshold, consecutive, max(1, min(top, 50))
+            )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    return {
+        "success": True,
+        "snapshot": data["snapshot"],
+        "data": {
+            "start": start_date.isoformat(),
+            "end": end_date.isoformat(),
+            "leaves": leaves,
+            "consecutive": consecutive,
+            "threshold": threshold,
+            **result
         }
     }
 
 
+# ==============================
+# DASHBOARD
+# ==============================
+
+def _dashboard_attendance(username, data, bundle, threshold, index):
+    attendance = {k: v for k, v in data.items() if k != 'snapshot'}
+    attendance['datewise'], attendance['datewise_sync'] = _datewise_since(username, data, None)
+    return attendance
+
+
+def _dashboard_absents(username, data, bundle, threshold, index):
+    return {
+        "total_absents": len(bundle.absents),
+        "absents": bundle.absents,
+        "monthwise_absents": bundle.monthwise_absents
+    }
+
+
+def _dashboard_analysis(username, data, bundle, threshold, index):
+    return bundle.view(('analysis', index), lambda: build_analysis_view(bundle, index))
+
+
+def _dashboard_timetable(username, data, bundle, threshold, index):
+    return TIMETABLE_DATA
+
+
+def _dashboard_risk(username, data, bundle, threshold, index):
+    return bundle.threshold_view('risk-engine', threshold, lambda: build_risk_view(bundle, threshold))
+
+
+def _dashboard_leave_week(username, data, bundle, threshold, index):
+    return bundle.view(('leave-simulator-week', index), lambda: build_leave_week_view(bundle, index))
+
+
+# Section name -> builder. Each returns what the matching endpoint puts
+# under "data" (/attendance, /analysis, /timetable, /risk-engine,
+# /leave-simulator-week, /absent-dates).
+DASHBOARD_SECTIONS = {
+    "attendance": _dashboard_attendance,
+    "analysis": _dashboard_analysis,
+    "timetable": _dashboard_timetable,
+    "risk": _dashboard_risk,
+    "leave_week": _dashboard_leave_week,
+    "absents": _dashboard_absents,
+}
+
+# Snapshot sections each dashboard section is built from
+DASHBOARD_NEEDS = {
+    "attendance": ALL_SECTIONS,
+    "analysis": {'subjects'},
+    "timetable": set(),
+    "risk": {'subjects'},
+    "leave_week": {'subjects'},
+    "absents": {'datewise'},
+}
+
+
+@app.get("/dashboard")
+async def dashboard(request: Request, response: Response, username: str = "", password: str = "",
+                    sections: str = "", threshold: float = 75.0):
+    """
+    Everything the web UI shows, from one snapshot and one analytics pass.
+    `sections` is a comma-separated subset of attendance, analysis,
+    timetable, risk, leave_week and absents (default: all); only those are
+    returned under "data", each shaped like its own endpoint's "data".
+    `threshold` applies to the risk section.
+    """
+    if not username or not password:
+        raise HTTPException(status_code=400, detail="Username and password are required")
+
+    wanted = [s.strip() for s in sections.split(',') if s.strip()] or list(DASHBOARD_SECTIONS)
+    unknown = [s for s in wanted if s not in DASHBOARD_SECTIONS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown sections: {', '.join(unknown)}. Choose from {', '.join(DASHBOARD_SECTIONS)}"
+        )
+
+    # The cheapest page still confirms the credentials when nothing else is needed
+    needs = set().union(*(DASHBOARD_NEEDS[name] for name in wanted)) or {'summary'}
+    data, msg = await _get_or_create_session(username, password, needs)
+    not_modified = check_etag(request, response, data)
+    if not_modified:
+        return not_modified
+
+    if not data:
+        raise HTTPException(status_code=500, detail="Failed to fetch attendance data")
+
+    index = timetable_index
+    with ANALYSIS_SECONDS.time('dashboard'):
+        bundle = get_analytics(data)
+        sections = {name: DASHBOARD_SECTIONS[name](username, data, bundle, threshold, index) for name in wanted}
+    return {
+        "success": True,
+        "message": msg,
+        "snapshot": data["snapshot"],
+        "data": sections
+    }
+
+
+# ==============================
+# METRICS ENDPOINT
+# ==============================
+
+@app.get("/metrics")
+async def metrics():
+    """Per-stage latency histograms, portal error counters and session stats for this process."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 # ==============================
 # STATIC SITE (UNCHANGED)
 # ==============================
 
 @app.get("/")
-def root():
-    return FileResponse('static/index.html')
+async def root(request: Request):
+    return await serve_static(request, 'static/index.html', 'text/html')
 
 @app.get("/manifest.json")
-def serve_manifest():
-    return FileResponse('static/manifest.json', media_type='application/manifest+json')
+async def serve_manifest(request: Request):
+    return await serve_static(request, 'static/manifest.json', 'application/manifest+json')
 
 @app.get("/sw.js")
-def serve_sw():
+async def serve_sw(request: Request):
     # Return sw.js with application/javascript type and specify path
-    return FileResponse('static/sw.js', media_type='application/javascript')
+    return await serve_static(request, 'static/sw.js', 'application/javascript')
 
 @app.get("/static/style.css")
-def serve_css():
-    return FileResponse('static/style.css', media_type='text/css')
+async def serve_css(request: Request):
+    return await serve_static(request, 'static/style.css', 'text/css')
 
 @app.get("/static/script.js")
-def serve_js():
-    return FileResponse('static/script.js', media_type='application/javascript')
+async def serve_js(request: Request):
+    return await serve_static(request, 'static/script.js', 'application/javascript')
 
 @app.get("/static/icon.svg")
-def serve_icon():
-    return FileResponse('static/icon.svg', media_type='image/svg+xml')
+async def serve_icon(request: Request):
+    return await serve_static(request, 'static/icon.svg', 'image/svg+xml')
@@ -0,0 +1,84 @@
+"""
+Sync vs async scraper throughput against the mock portal.
+
+Each simulated student does a full login + get_attendance(). The sync path
+runs LNCTAttendance on a 40-thread pool, which is the size of the threadpool
+FastAPI uses for plain `def` handlers; the async path runs every student
+concurrently on one event loop with AsyncLNCTAttendance.
+
+    python -m bench.bench_async --users 200 --latency 0.3
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import at
+from bench.mock_portal import spawn_mock_portal
+
+SYNC_THREADS = 40
+
+
+def _sync_student(base_url, i):
+    start = time.perf_counter()
+    lnct = at.LNCTAttendance(base_url)
+    ok = lnct.login(f"user{i}", "secret")[0]
+    data, _ = lnct.get_attendance() if ok else (None, None)
+    lnct.session.close()
+    return time.perf_counter() - start, data is not None
+
+
+async def _async_student(base_url, i):
+    start = time.perf_counter()
+    lnct = at.AsyncLNCTAttendance(base_url)
+    try:
+        ok = (await lnct.login(f"user{i}", "secret"))[0]
+        data, _ = (await lnct.get_attendance()) if ok else (None, None)
+    finally:
+        await lnct.aclose()
+    return time.perf_counter() - start, data is not None
+
+
+def run_sync(base_url, users):
+    with ThreadPoolExecutor(max_workers=SYNC_THREADS) as pool:
+        return list(pool.map(lambda i: _sync_student(base_url, i), range(users)))
+
+
+async def run_async(base_url, users):
+    return await asyncio.gather(*(_async_student(base_url, i) for i in range(users)))
+
+
+def report(label, results, wall):
+    latencies = sorted(r[0] for r in results)
+    ok = sum(1 for r in results if r[1])
+    p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+    print(f"{label:<6} ok={ok}/{len(results)} wall={wall:.2f}s "
+          f"throughput={len(results) / wall:.1f} students/s "
+          f"mean={statistics.mean(latencies):.2f}s p95={p95:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.3, help="mock portal latency per request (s)")
+    parser.add_argument("--rows", type=int, default=300, help="datewise rows per student")
+    args = parser.parse_args()
+    logging.getLogger("at").setLevel(logging.WARNING)
+
+    portal, base_url = spawn_mock_portal(latency=args.latency, rows=args.rows)
+    try:
+        start = time.perf_counter()
+        results = run_sync(base_url, args.users)
+        report("sync", results, time.perf_counter() - start)
+
+        start = time.perf_counter()
+        results = asyncio.run(run_async(base_url, args.users))
+        report("async", results, time.perf_counter() - start)
+    finally:
+        portal.terminate()
+
+
+if __name__ == "__main__":
+    main()
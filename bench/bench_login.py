@@ -0,0 +1,97 @@
+"""
+Cold-login cost against the mock portal: latency, CPU and portal round trips.
+
+Each login is a brand-new scraper, as for a student without a session. The
+baseline fetches studentLogin.aspx and reads the form with BeautifulSoup,
+which is how logins used to work; "inputs only" fetches the page but reads
+just its <input> tags; "cached form" posts straight away with the login
+form (ViewState included) kept from an earlier login.
+
+    python -m bench.bench_login --logins 200 --latency 0.05
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+
+import httpx
+from bs4 import BeautifulSoup, SoupStrainer
+
+import at
+from bench.mock_portal import LOGIN_PAGE, spawn_mock_portal
+
+
+def soup_login_form(parser, content):
+    """The LoginForm as the BeautifulSoup parser used to read it."""
+    soup = BeautifulSoup(content, at.HTML_PARSER, parse_only=SoupStrainer('input'))
+    inputs = [dict(inp.attrs) for inp in soup.find_all('input')]
+    names = {inp.get('name') for inp in inputs}
+    u_field = next((f for f in at.LOGIN_USER_FIELDS if f in names), None)
+    p_field = next((f for f in at.LOGIN_PASSWORD_FIELDS if f in names), None)
+    if not (u_field and p_field):
+        return None
+    fields = {inp['name']: inp.get('value', '') for inp in inputs if parser._is_valid_form_input(inp)}
+    btn = soup.find('input', {'type': 'submit'})
+    submit = (btn['name'], btn.get('value', 'Login')) if btn and btn.get('name') else None
+    return at.LoginForm(u_field, p_field, fields, submit)
+
+
+VARIANTS = [
+    ("soup, no cache (baseline)", soup_login_form, False),
+    ("inputs only, no cache", at.PortalParser.parse_login_form, False),
+    ("cached form", at.PortalParser.parse_login_form, True),
+]
+
+
+async def run(base_url, logins, cached):
+    latencies = []
+    ok = 0
+    for i in range(logins):
+        if not cached:
+            at.login_forms.clear()
+        lnct = at.AsyncLNCTAttendance(base_url)
+        start = time.perf_counter()
+        ok += (await lnct.login(f"user{i}", "secret", with_name=False))[0]
+        latencies.append(time.perf_counter() - start)
+        await lnct.aclose()
+    return latencies, ok
+
+
+def requests_served(base_url):
+    return httpx.get(base_url + "/__stats").json()["requests"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--logins", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="mock portal latency per request (s)")
+    args = parser.parse_args()
+    logging.getLogger("at").setLevel(logging.WARNING)
+
+    portal = at.PortalParser()
+    expected = soup_login_form(portal, LOGIN_PAGE.encode()).fill("user", "secret")
+    assert portal.build_login_form(LOGIN_PAGE.encode(), "user", "secret") == expected, "inputs-only parsing changed the login form"
+
+    proc, base_url = spawn_mock_portal(latency=args.latency)
+    try:
+        print(f"{'variant':<28}{'ok':>8}{'mean ms':>10}{'p95 ms':>10}{'CPU ms':>10}{'requests':>10}   (per login)")
+        for label, parse, cached in VARIANTS:
+            at.AsyncLNCTAttendance.parse_login_form = parse
+            at.login_forms.clear()
+            asyncio.run(run(base_url, 1, cached))  # warm up, and fill the cache for "cached form"
+            before = requests_served(base_url)
+            cpu = time.process_time()
+            latencies, ok = asyncio.run(run(base_url, args.logins, cached))
+            cpu = (time.process_time() - cpu) / args.logins * 1000
+            served = (requests_served(base_url) - before - 1) / args.logins
+            latencies.sort()
+            p95 = latencies[max(0, int(len(latencies) * 0.95) - 1)]
+            print(f"{label:<28}{f'{ok}/{args.logins}':>8}{statistics.mean(latencies) * 1000:>10.1f}"
+                  f"{p95 * 1000:>10.1f}{cpu:>10.2f}{served:>10.1f}")
+    finally:
+        proc.terminate()
+
+
+if __name__ == "__main__":
+    main()
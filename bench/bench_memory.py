@@ -0,0 +1,78 @@
+"""
+Memory held per cached student, measured with tracemalloc.
+
+Parses the saved portal pages in bench/fixtures once per simulated student
+and keeps every result alive, like the snapshot cache does. The baseline
+turns each record back into a dict of freshly allocated strings, which is
+what the parser used to produce.
+
+    python -m bench.bench_memory --users 200
+"""
+import argparse
+import gc
+import logging
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import at
+from bench.bench_parse import FIXTURES
+
+
+def copy_str(value):
+    # Slicing a str back together allocates a new, unshared object
+    return value[:1] + value[1:] if isinstance(value, str) and len(value) > 1 else value
+
+
+def as_dicts(data):
+    data = dict(data)
+    data["datewise"] = [{k: copy_str(row[k]) for k in row.keys()} for row in data["datewise"]]
+    data["subjects"] = [{k: copy_str(row[k]) for k in row.keys()} for row in data["subjects"]]
+    return data
+
+
+def parse(parser, pages):
+    url = at.PORTAL_BASE_URL + "/AccSoft2/Parents/"
+    data, _ = parser.parse_attendance({
+        "attendance_page": (SimpleNamespace(url=url + "StuAttendanceStatus.aspx", content=pages["attendance"]), 0),
+        "subject_page": (SimpleNamespace(content=pages["subwiseattn"]), 0),
+        "personal_details_page": (SimpleNamespace(content=pages["personal_details"]), 0),
+    }, time.perf_counter())
+    return data
+
+
+def measure(users, build):
+    gc.collect()
+    tracemalloc.start()
+    kept = [build() for _ in range(users)]
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, kept
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=200)
+    args = parser.parse_args()
+    logging.getLogger("at").setLevel(logging.WARNING)
+
+    pages = {p.stem: p.read_bytes() for p in FIXTURES.glob("*.html")}
+    portal = at.PortalParser()
+    # Warm up caches shared by every student (interned strings, parsed dates)
+    sample = parse(portal, pages)
+    rows = len(sample["datewise"])
+
+    baseline, _ = measure(args.users, lambda: as_dicts(parse(portal, pages)))
+    records, _ = measure(args.users, lambda: parse(portal, pages))
+
+    print(f"{args.users} students, {rows} datewise rows and {len(sample['subjects'])} subjects each")
+    print(f"{'variant':<24}{'KiB per student':>18}{'bytes per row':>16}")
+    for label, size in [("dicts (baseline)", baseline), ("slotted records", records)]:
+        per_user = size / args.users
+        print(f"{label:<24}{per_user / 1024:>18.1f}{per_user / rows:>16.1f}")
+    print(f"saved {(baseline - records) / args.users / 1024:.1f} KiB per student ({1 - records / baseline:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""
+Parsing micro-benchmark over the saved portal pages in bench/fixtures.
+
+Compares the original approach (full html.parser tree for every page)
+with at.py's targeted parsing on each installed backend, and checks that
+every variant returns exactly what the baseline returns.
+
+    python -m bench.bench_parse --repeat 20
+"""
+import argparse
+import logging
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from bs4 import BeautifulSoup
+
+import at
+
+FIXTURES = Path(__file__).parent / "fixtures"
+VARIANTS = [
+    ("html.parser full tree (baseline)", "html.parser", False),
+    ("html.parser targeted", "html.parser", True),
+    ("lxml targeted", "lxml", True),
+]
+
+
+def load_fixtures():
+    pages = {p.stem: p.read_bytes() for p in FIXTURES.glob("*.html")}
+    url = at.PORTAL_BASE_URL + "/AccSoft2/Parents/"
+    return {
+        "login_form": lambda parser: parser.build_login_form(pages["login"], "user", "secret"),
+        "login_success": lambda parser: parser._check_login_success(SimpleNamespace(
+            url=url + "Dashboard.aspx", text=pages["dashboard"].decode(), content=pages["dashboard"])),
+        "attendance": lambda parser: strip_timings(parser.parse_attendance({
+            "attendance_page": (SimpleNamespace(url=url + "StuAttendanceStatus.aspx", content=pages["attendance"]), 0),
+            "subject_page": (SimpleNamespace(content=pages["subwiseattn"]), 0),
+            "personal_details_page": (SimpleNamespace(content=pages["personal_details"]), 0),
+        }, time.perf_counter())),
+    }
+
+
+def strip_timings(result):
+    data, msg = result
+    return {k: v for k, v in data.items() if k != "timings"}, msg
+
+
+def configure(backend, targeted):
+    at.HTML_PARSER = backend
+    if targeted:
+        at.make_soup = ORIGINAL_MAKE_SOUP
+    else:
+        at.make_soup = lambda content, parse_only=None: BeautifulSoup(content, backend)
+
+
+def installed(backend):
+    try:
+        BeautifulSoup("<p></p>", backend)
+        return True
+    except Exception:
+        return False
+
+
+ORIGINAL_MAKE_SOUP = at.make_soup
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    logging.getLogger("at").setLevel(logging.WARNING)
+
+    cases = load_fixtures()
+    portal = at.PortalParser()
+    configure("html.parser", targeted=False)
+    expected = {name: case(portal) for name, case in cases.items()}
+
+    print(f"{'variant':<36}" + "".join(f"{name:>16}" for name in cases) + "   (ms per page)")
+    for label, backend, targeted in VARIANTS:
+        if not installed(backend):
+            print(f"{label:<36}  not installed")
+            continue
+        configure(backend, targeted)
+        row = []
+        for name, case in cases.items():
+            assert case(portal) == expected[name], f"{label} changed the result of {name}"
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                case(portal)
+            row.append((time.perf_counter() - start) / args.repeat * 1000)
+        print(f"{label:<36}" + "".join(f"{ms:>16.2f}" for ms in row))
+
+
+if __name__ == "__main__":
+    main()
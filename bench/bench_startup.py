@@ -0,0 +1,108 @@
+"""
+Cold-start cost of at.py, as a serverless instance (vercel.json) pays it.
+
+Each run starts a fresh interpreter that imports at.py under
+`python -X importtime` and serves its first request in-process, against the
+mock portal, without the lifespan hooks (serverless runtimes may skip them).
+Reports the median import time, time to the first response and the imports
+that cost the most, and exits 1 when the median cold start is over budget.
+
+    python -m bench.bench_startup --runs 5 --budget-ms 750
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+from bench.mock_portal import spawn_mock_portal
+
+ROOT = Path(__file__).resolve().parent.parent
+
+CHILD = """
+import time
+start = time.perf_counter()
+import at
+imported = time.perf_counter()
+import asyncio, json, sys
+import httpx
+
+async def first_request(path):
+    transport = httpx.ASGITransport(app=at.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+        return (await client.get(path)).status_code
+
+status = asyncio.run(first_request(sys.argv[1]))
+done = time.perf_counter()
+print(json.dumps({"import": imported - start, "first_response": done - imported, "status": status}))
+"""
+
+
+def cold_start(path, env):
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD, path],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["imports"] = top_level_imports(proc.stderr)
+    return result
+
+
+def top_level_imports(importtime_log):
+    """Cumulative microseconds of each module at.py imports directly (and not already loaded)."""
+    imports = {}
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if not cumulative.strip().isdigit():
+            continue
+        # A module is listed after everything it imported, one level deeper
+        if not name.startswith("  "):
+            if name.strip() == "at":
+                return imports
+            imports = {}
+        elif not name.startswith("    "):
+            imports[name.strip()] = int(cumulative)
+    return imports
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/attendance-lite?username=u1&password=x",
+                        help="first request; the default logs in and scrapes like a first visit")
+    parser.add_argument("--budget-ms", type=float, default=750, help="median import + first response allowed")
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    args = parser.parse_args()
+
+    portal, base_url = spawn_mock_portal(rows=50)
+    env = dict(os.environ, LNCT_PORTAL_URL=base_url)
+    try:
+        cold_start(args.path, env)  # compiles bytecode, like a deployment build
+        runs = [cold_start(args.path, env) for _ in range(args.runs)]
+    finally:
+        portal.terminate()
+
+    import_ms = statistics.median(r["import"] for r in runs) * 1000
+    first_ms = statistics.median(r["first_response"] for r in runs) * 1000
+    total_ms = statistics.median(r["import"] + r["first_response"] for r in runs) * 1000
+    print(f"{args.runs} cold starts, first request {args.path} -> {runs[0]['status']}")
+    print(f"import at.py     {import_ms:8.1f} ms")
+    print(f"first response   {first_ms:8.1f} ms")
+    print(f"cold start       {total_ms:8.1f} ms  (budget {args.budget_ms:.0f} ms)")
+
+    imports = {name: statistics.median(r["imports"].get(name, 0) for r in runs) for name in runs[0]["imports"]}
+    print(f"\nslowest imports of at.py (cumulative, median; -X importtime)")
+    for name, us in sorted(imports.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {name:<28}{us / 1000:8.1f} ms")
+
+    if total_ms > args.budget_ms:
+        print(f"\nOVER BUDGET by {total_ms - args.budget_ms:.1f} ms")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
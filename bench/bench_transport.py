@@ -0,0 +1,76 @@
+"""
+Cold-login cost with the shared portal transport vs a pool per scraper.
+
+Runs waves of brand-new students (login + get_attendance, as a first visit
+does) and counts how many TCP connections the mock portal had to accept.
+Each new connection costs --handshake-latency, like a TLS handshake would.
+"per-scraper" gives every AsyncLNCTAttendance its own transport, which is
+how sessions behaved before the shared pool.
+
+    python -m bench.bench_transport --waves 5 --users 50 --latency 0.1 --handshake-latency 0.15
+"""
+import argparse
+import asyncio
+import logging
+import statistics
+import time
+
+import httpx
+
+import at
+from bench.mock_portal import spawn_mock_portal
+
+
+async def student(base_url, name, shared):
+    transport = None if shared else httpx.AsyncHTTPTransport(verify=False)
+    lnct = at.AsyncLNCTAttendance(base_url, transport=transport)
+    start = time.perf_counter()
+    try:
+        ok = (await lnct.login(name, "secret"))[0]
+        if ok:
+            await lnct.get_attendance()
+        return time.perf_counter() - start
+    finally:
+        await lnct.aclose()
+
+
+async def run(base_url, waves, users, shared):
+    latencies = []
+    for wave in range(waves):
+        latencies += await asyncio.gather(*(
+            student(base_url, f"w{wave}u{i}", shared) for i in range(users)
+        ))
+    await at.close_portal_transport()
+    return latencies
+
+
+def connections(base_url):
+    return httpx.get(base_url + "/__stats").json()["connections"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--waves", type=int, default=5)
+    parser.add_argument("--users", type=int, default=50, help="new students per wave")
+    parser.add_argument("--latency", type=float, default=0.1)
+    parser.add_argument("--handshake-latency", type=float, default=0.15)
+    parser.add_argument("--rows", type=int, default=50)
+    args = parser.parse_args()
+    logging.getLogger("at").setLevel(logging.WARNING)
+
+    portal, base_url = spawn_mock_portal(latency=args.latency, rows=args.rows,
+                                         handshake_latency=args.handshake_latency)
+    try:
+        for label, shared in (("per-scraper", False), ("shared", True)):
+            before = connections(base_url)
+            latencies = asyncio.run(run(base_url, args.waves, args.users, shared))
+            opened = connections(base_url) - before - 1
+            print(f"{label:<12} students={len(latencies)} connections={opened} "
+                  f"mean={statistics.mean(latencies) * 1000:.0f}ms "
+                  f"p95={sorted(latencies)[int(len(latencies) * 0.95) - 1] * 1000:.0f}ms")
+    finally:
+        portal.terminate()
+
+
+if __name__ == "__main__":
+    main()
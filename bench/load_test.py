@@ -0,0 +1,194 @@
+"""
+End-to-end load test of every at.py endpoint against the mock portal.
+
+Starts bench/mock_portal.py and a uvicorn server for at.py (pointed at the
+mock through LNCT_PORTAL_URL) in child processes, then drives each endpoint
+in turn at the requested concurrency. Reports p50/p95/p99 latency,
+throughput and the server's peak RSS.
+
+    python -m bench.load_test --requests 400 --concurrency 50 --users 100
+    python -m bench.load_test --save baseline.json
+    python -m bench.load_test --compare baseline.json --max-regression 0.25
+
+With --compare, the run fails (exit 1) if any endpoint's p95 latency or
+throughput is worse than the baseline by more than --max-regression.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+from bench.mock_portal import spawn_mock_portal
+
+ENDPOINTS = [
+    "/attendance",
+    "/attendance-lite",
+    "/analysis",
+    "/risk-engine",
+    "/leave-simulator?day=Monday",
+    "/leave-simulator-week",
+    "/absent-dates",
+    "/debug-subjects",
+    "/timetable",
+    "/dashboard",
+    "/leave-planner?leaves=2",
+    "POST /attendance/batch",
+]
+# Students per /attendance/batch request
+BATCH_STUDENTS = 5
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(portal_url, env_overrides, show_log=False):
+    port = free_port()
+    env = {**os.environ, "LNCT_PORTAL_URL": portal_url, **env_overrides}
+    output = None if show_log else subprocess.DEVNULL
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "at:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=output, stderr=output,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(base_url + "/timetable", timeout=1)
+            return proc, base_url
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError("at.py server did not start")
+
+
+def peak_rss_mb(pid):
+    """High-water mark of the process' resident set (Linux /proc)."""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def percentile(sorted_values, pct):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def drive(base_url, endpoint, requests, concurrency, users):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, errors = [], 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=120, limits=limits) as client:
+
+        async def one(i):
+            nonlocal errors
+            method, _, path = endpoint.rpartition(" ")
+            sep = "&" if "?" in path else "?"
+            url = f"{path}{sep}username=student{i % users}&password=secret"
+            students = [{"username": f"student{(i * BATCH_STUDENTS + k) % users}", "password": "secret"}
+                        for k in range(BATCH_STUDENTS)]
+            async with semaphore:
+                start = time.perf_counter()
+                try:
+                    if method == "POST":
+                        r = await client.post(path, json={"students": students})
+                    else:
+                        r = await client.get(url)
+                    if r.status_code != 200:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append((time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        wall = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        "throughput_rps": round(requests / wall, 1),
+        "errors": errors,
+    }
+
+
+def compare(results, baseline, max_regression):
+    failures = []
+    for endpoint, current in results["endpoints"].items():
+        previous = baseline.get("endpoints", {}).get(endpoint)
+        if not previous:
+            continue
+        if current["p95_ms"] > previous["p95_ms"] * (1 + max_regression):
+            failures.append(f"{endpoint}: p95 {previous['p95_ms']} -> {current['p95_ms']} ms")
+        if current["throughput_rps"] < previous["throughput_rps"] * (1 - max_regression):
+            failures.append(f"{endpoint}: throughput {previous['throughput_rps']} -> {current['throughput_rps']} req/s")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=400, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--users", type=int, default=100, help="distinct student accounts to cycle through")
+    parser.add_argument("--latency", type=float, default=0.2, help="mock portal latency per request (s)")
+    parser.add_argument("--rows", type=int, default=300, help="datewise rows per student")
+    parser.add_argument("--endpoint", action="append",
+                        help="limit the run to these endpoints (repeatable), e.g. '/analysis' or 'POST /attendance/batch'")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="extra environment for the at.py server, e.g. SNAPSHOT_CACHE_TTL=0")
+    parser.add_argument("--server-log", action="store_true", help="show the at.py server's log output")
+    parser.add_argument("--save", help="write results as JSON")
+    parser.add_argument("--compare", help="baseline JSON from an earlier --save")
+    parser.add_argument("--max-regression", type=float, default=0.25)
+    args = parser.parse_args()
+
+    env_overrides = dict(item.split("=", 1) for item in args.env)
+    portal, portal_url = spawn_mock_portal(latency=args.latency, rows=args.rows)
+    server, base_url = start_server(portal_url, env_overrides, args.server_log)
+    results = {"config": {k: v for k, v in vars(args).items() if k not in ("save", "compare")}, "endpoints": {}}
+    try:
+        print(f"{'endpoint':<30}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'errors':>8}")
+        for endpoint in args.endpoint or ENDPOINTS:
+            stats = asyncio.run(drive(base_url, endpoint, args.requests, args.concurrency, args.users))
+            results["endpoints"][endpoint] = stats
+            print(f"{endpoint:<30}{stats['p50_ms']:>10}{stats['p95_ms']:>10}{stats['p99_ms']:>10}"
+                  f"{stats['throughput_rps']:>10}{stats['errors']:>8}")
+        results["peak_rss_mb"] = peak_rss_mb(server.pid)
+        if results["peak_rss_mb"] is not None:
+            print(f"server peak RSS: {results['peak_rss_mb']:.1f} MB")
+    finally:
+        server.terminate()
+        portal.terminate()
+        server.wait()
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            failures = compare(results, json.load(f), args.max_regression)
+        for failure in failures:
+            print(f"REGRESSION {failure}")
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
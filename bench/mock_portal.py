@@ -0,0 +1,265 @@
+"""
+Local stand-in for the accsoft.lnctu.ac.in student portal.
+
+Serves studentLogin.aspx, StuAttendanceStatus.aspx, subwiseattn.aspx and
+StudentPersonalDetails.aspx with synthetic data and an injected per-request
+latency, so the scrapers in at.py can be exercised without real credentials.
+--handshake-latency adds a one-off delay to each new TCP connection,
+standing in for the TLS handshake the real portal costs. Any username logs
+in; the password "wrong" is rejected with the portal's error message, and a
+ViewState the mock did not issue gets the login form back without one.
+GET /__stats returns connection and request counters as JSON.
+
+    python -m bench.mock_portal --port 8765 --latency 0.2
+"""
+import argparse
+import json
+import socket
+import subprocess
+import sys
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+SUBJECTS = [
+    "Data Visualization and Story Telling",
+    "Web Technology",
+    "Web Technology-P",
+    "Analysis and Design of Algorithms",
+    "Software Engineering and Project Management",
+    "Machine Learning and Pattern Recognition",
+]
+
+SESSION_START = date(2025, 7, 1)
+
+
+# Real portal pages wrap every view in a master page: a large __VIEWSTATE,
+# navigation menus and scripts. The parsers never read these, but they have
+# to get through them, so the mock carries comparable weight.
+MENU = "".join(
+    f'<li class="nav-item"><a class="nav-link" href="/AccSoft2/Parents/Page{i}.aspx"><i class="fa fa-circle"></i> Menu item {i}</a></li>'
+    for i in range(60)
+)
+SCRIPTS = "".join(
+    f'<script type="text/javascript">//<![CDATA[\nSys.Application.add_init(function() {{ $create(Sys.UI._Timer, {{"enabled":true,"interval":{i}}}, null, null, $get("t{i}")); }});\n//]]></script>'
+    for i in range(20)
+)
+VIEWSTATE = "dDwtMTA4MjQ0NzQ0Mzs7Pg" * 400
+
+
+# The login page carries the same master-page weight as the others
+LOGIN_PAGE = f"""<!DOCTYPE html><html><head><title>AccSoft</title>{SCRIPTS}</head>
+<body><form method="post" action="studentLogin.aspx">
+<input type="hidden" name="__VIEWSTATE" value="{VIEWSTATE}" />
+<input type="hidden" name="__EVENTVALIDATION" value="wEWBALs3a6JBQ==" />
+<input name="ctl00$cph1$txtStuUser" type="text" />
+<input name="ctl00$cph1$txtStuPsw" type="password" />
+<input type="radio" name="ctl00$cph1$rbtnType" value="Student" checked="checked" />
+<input type="submit" name="ctl00$cph1$btnStuLogin" value="Login" />
+<div class="sidebar"><ul class="nav flex-column">{MENU}</ul></div>
+</form></body></html>"""
+# What the portal answers a wrong password with: the form again, with a message
+LOGIN_ERROR_PAGE = LOGIN_PAGE.replace(
+    '<div class="sidebar">',
+    '<span id="ctl00_cph1_lblMsg" style="color:Red;">Invalid UserName or Password</span>\n<div class="sidebar">', 1,
+)
+
+
+def layout(username, content):
+    return f"""<!DOCTYPE html><html><head><title>AccSoft</title>
+<link href="/AccSoft2/css/bootstrap.min.css" rel="stylesheet" />{SCRIPTS}</head>
+<body><form method="post" id="aspnetForm">
+<input type="hidden" name="__VIEWSTATE" id="__VIEWSTATE" value="{VIEWSTATE}" />
+<nav class="navbar"><div class="container-fluid">{name_span(username)}
+<a href="logout.aspx">Logout</a></div></nav>
+<div class="sidebar"><ul class="nav flex-column">{MENU}</ul></div>
+<div class="content">{content}</div></form></body></html>"""
+
+
+def name_span(username):
+    return f'<span class="d-lg-inline-flex d-none">STUDENT {username.upper()}</span>'
+
+
+def attendance_page(username, rows):
+    absent = sum(1 for i in range(rows) if i % 5 == 0)
+    body = "".join(
+        f"<tr><td>{i + 1}</td><td>{(SESSION_START + timedelta(days=i // 7)):%d %b %Y}</td><td>Lecture No-{i % 7 + 1}</td>"
+        f"<td>{SUBJECTS[i % len(SUBJECTS)]}</td><td>{'A' if i % 5 == 0 else 'P'}</td></tr>"
+        for i in range(rows)
+    )
+    return layout(username, f"""
+<span id="ctl00_ctl00_ContentPlaceHolder1_cp2_lbltotperiod111">Total Periods : {rows}</span>
+<span id="ctl00_ctl00_ContentPlaceHolder1_cp2_lbltotalp11">Present : {rows - absent}</span>
+<span id="ctl00_ctl00_ContentPlaceHolder1_cp2_lbltotala11">Absent : {absent}</span>
+<table id="ctl00_ctl00_ContentPlaceHolder1_cp2_Gridview1">
+<tr><th>S.No.</th><th>Date</th><th>Lecture</th><th>Subject</th><th>Status</th></tr>{body}</table>""")
+
+
+def subject_page(username):
+    body = "".join(
+        f"<tr><td>{name}</td><td>CS{500 + i}</td><td>{40 + i * 3}</td><td>{28 + i * 3}</td></tr>"
+        for i, name in enumerate(SUBJECTS)
+    )
+    return layout(username, f"""<table><tr><td>Session 2025-26</td></tr></table>
+<table><tr><th>Subject Name</th><th>Subject Code</th><th>Classes Held</th><th>Classes Attended</th></tr>{body}</table>""")
+
+
+def personal_details_page(username):
+    return layout(username, f"""
+<input name="ctl00$ContentPlaceHolder1$txtUEnrollNo" type="text" id="ctl00_ContentPlaceHolder1_txtUEnrollNo" value="0157CS{username[-6:]:0>6}" />""")
+
+
+STATS = {"connections": 0, "requests": 0}
+_stats_lock = threading.Lock()
+
+
+def _count(key):
+    with _stats_lock:
+        STATS[key] += 1
+
+
+class PortalHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    latency = 0.0
+    handshake_latency = 0.0
+    rows = 300
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        # One handler instance per accepted TCP connection
+        _count("connections")
+        time.sleep(self.handshake_latency)
+        super().setup()
+
+    def handle_one_request(self):
+        # command is left over from the previous request on a keep-alive
+        # connection; cleared, it is only set again if a request was read
+        self.command = None
+        super().handle_one_request()
+        if self.command:
+            _count("requests")
+
+    def _user(self):
+        for part in (self.headers.get("Cookie") or "").split(";"):
+            key, _, value = part.strip().partition("=")
+            if key == "portal_user" and value:
+                return value
+        return None
+
+    def _send(self, status, body="", headers=()):
+        time.sleep(self.latency)
+        payload = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        for key, value in headers:
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        path = self.path.split("?")[0].lower()
+        user = self._user()
+        if path == "/__stats":
+            with _stats_lock:
+                body = json.dumps(STATS)
+            payload = body.encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            return self.wfile.write(payload)
+        if path.endswith("studentlogin.aspx"):
+            return self._send(200, LOGIN_PAGE, [("Set-Cookie", "ASP.NET_SessionId=mock; path=/")])
+        if not user:
+            return self._send(302, headers=[("Location", "/Accsoft2/studentLogin.aspx")])
+        if path.endswith("dashboard.aspx"):
+            return self._send(200, layout(user, "<h3>Dashboard</h3>"))
+        if path.endswith("stuattendancestatus.aspx"):
+            return self._send(200, attendance_page(user, self.rows))
+        if path.endswith("subwiseattn.aspx"):
+            return self._send(200, subject_page(user))
+        if path.endswith("studentpersonaldetails.aspx"):
+            return self._send(200, personal_details_page(user))
+        self._send(404, "Not found")
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        form = parse_qs(self.rfile.read(length).decode())
+        username = form.get("ctl00$cph1$txtStuUser", [""])[0]
+        password = form.get("ctl00$cph1$txtStuPsw", [""])[0]
+        if not self.path.lower().endswith("studentlogin.aspx") or not username:
+            return self._send(200, LOGIN_PAGE)
+        if form.get("__VIEWSTATE", [VIEWSTATE])[0] != VIEWSTATE:
+            # A ViewState this portal did not issue: the form is re-rendered, without a message
+            return self._send(200, LOGIN_PAGE)
+        if password == "wrong":
+            return self._send(200, LOGIN_ERROR_PAGE)
+        self._send(302, headers=[
+            ("Location", "/AccSoft2/Parents/Dashboard.aspx"),
+            ("Set-Cookie", f"portal_user={username}; path=/"),
+        ])
+
+
+class PortalServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+def start_mock_portal(port=0, latency=0.0, rows=300, handshake_latency=0.0):
+    """Start the portal on a background thread. Returns (server, base_url)."""
+    handler = type("ConfiguredPortalHandler", (PortalHandler,), {
+        "latency": latency, "rows": rows, "handshake_latency": handshake_latency,
+    })
+    server = PortalServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def spawn_mock_portal(latency=0.0, rows=300, handshake_latency=0.0):
+    """
+    Run the portal in a child process so its CPU time does not compete with
+    the code being measured. Returns (process, base_url); terminate() it.
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "bench.mock_portal", "--port", str(port),
+         "--latency", str(latency), "--rows", str(rows),
+         "--handshake-latency", str(handshake_latency)],
+        stdout=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.2).close()
+            return proc, f"http://127.0.0.1:{port}"
+        except OSError:
+            time.sleep(0.05)
+    proc.terminate()
+    raise RuntimeError("mock portal did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds added to every response")
+    parser.add_argument("--rows", type=int, default=300, help="datewise rows per student")
+    parser.add_argument("--handshake-latency", type=float, default=0.0, help="seconds added to each new connection")
+    args = parser.parse_args()
+    server, base_url = start_mock_portal(args.port, args.latency, args.rows, args.handshake_latency)
+    print(f"Mock portal on {base_url} (latency={args.latency}s, rows={args.rows})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
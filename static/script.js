@@ -22,8 +22,15 @@ document.addEventListener('DOMContentLoaded', () => {
     let currentData = null;
     let attendanceChart = null;
     let analysisData = null;
+    let timetableData = null;
+    // Sections prefetched by /dashboard at login, used by the tabs below
+    let dashboardData = {};
     let currentUsername = '';
     let currentPassword = '';
+    // Everything the dashboard shows comes from /dashboard, which answers
+    // for any subset of these sections from a single portal fetch.
+    // Declared before checkAutoLogin() runs, which already needs it.
+    const DASHBOARD_SECTIONS = ['attendance', 'analysis', 'timetable', 'risk', 'leave_week', 'absents'];
 
     // Auto-login if credentials exist in localStorage
     checkAutoLogin();
@@ -75,13 +82,17 @@ document.addEventListener('DOMContentLoaded', () => {
         loginError.classList.add('hidden');
 
         try {
-            const response = await fetch(`/attendance?username=${encodeURIComponent(username)}&password=${encodeURIComponent(password)}`);
+            const response = await fetch(dashboardUrl(DASHBOARD_SECTIONS, `&threshold=${riskThreshold()}`));
             const result = await response.json();
 
             if (result.success) {
-                currentData = result.data;
+                dashboardData = result.data;
+                currentData = dashboardData.attendance;
                 showDashboardUI(currentData);
-                await fetchAnalysis(username, password);
+                analysisData = dashboardData.analysis;
+                renderAnalysis();
+                timetableData = dashboardData.timetable;
+                renderTimetable();
                 // Save credentials for auto-login next time
                 saveCredentials(username, password);
             } else {
@@ -109,6 +120,7 @@ document.addEventListener('DOMContentLoaded', () => {
         loginSection.classList.add('active-section');
         loginForm.reset();
         currentData = null;
+        dashboardData = {};
         // Clear saved credentials on logout
         clearCredentials();
     });
@@ -445,29 +457,32 @@ document.addEventListener('DOMContentLoaded', () => {
     // ANALYSIS & TIMETABLE FUNCTIONS
     // ==============================
 
-    async function fetchAnalysis(username, password) {
-        try {
-            const response = await fetch(`/analysis?username=${encodeURIComponent(username)}&password=${encodeURIComponent(password)}`);
-            const result = await response.json();
-            if (result.success && result.data) {
-                analysisData = result.data;
-                renderAnalysis();
-            }
-        } catch (err) {
-            console.error('Failed to fetch analysis:', err);
+    function dashboardUrl(sections, extra = '') {
+        return `/dashboard?username=${encodeURIComponent(currentUsername)}&password=${encodeURIComponent(currentPassword)}&sections=${sections.join(',')}${extra}`;
+    }
+
+    // Fetch only the given sections and merge them into dashboardData
+    async function fetchSections(sections, extra = '') {
+        const response = await fetch(dashboardUrl(sections, extra));
+        const result = await response.json();
+        if (!result.success) {
+            throw new Error(result.detail || 'Request failed');
         }
+        Object.assign(dashboardData, result.data);
+        return result.data;
+    }
+
+    function riskThreshold() {
+        return parseFloat(document.getElementById('risk-threshold').value) || 75;
     }
 
-    async function fetchTimetable() {
+    async function fetchAnalysis() {
         try {
-            const response = await fetch('/timetable');
-            const result = await response.json();
-            if (result.success) {
-                timetableData = result.data;
-                renderTimetable();
-            }
+            const data = await fetchSections(['analysis']);
+            analysisData = data.analysis;
+            renderAnalysis();
         } catch (err) {
-            console.error('Failed to fetch timetable:', err);
+            console.error('Failed to fetch analysis:', err);
         }
     }
 
@@ -682,7 +697,7 @@ document.addEventListener('DOMContentLoaded', () => {
     // Refresh analysis button
     document.getElementById('refresh-analysis').addEventListener('click', async () => {
         if (currentUsername && currentPassword) {
-            await fetchAnalysis(currentUsername, currentPassword);
+            await fetchAnalysis();
         }
     });
 
@@ -702,14 +717,14 @@ document.addEventListener('DOMContentLoaded', () => {
         document.getElementById('risk-summary').innerHTML = '<div style="text-align: center; padding: 2rem;"><i class="fa-solid fa-spinner fa-spin" style="font-size: 2rem; color: var(--accent-primary);"></i><p style="margin-top: 1rem; color: var(--text-secondary);">Analyzing risk...</p></div>';
         document.getElementById('risk-details').innerHTML = '';
 
-        const threshold = parseFloat(document.getElementById('risk-threshold').value) || 75;
+        const threshold = riskThreshold();
 
         try {
-            const response = await fetch(`/risk-engine?username=${encodeURIComponent(currentUsername)}&password=${encodeURIComponent(currentPassword)}&threshold=${threshold}`);
-            const result = await response.json();
-            if (result.success) {
-                renderRiskEngine(result.data);
+            // Login prefetched the risk section for the threshold shown then
+            if (!dashboardData.risk || dashboardData.risk.threshold !== threshold) {
+                await fetchSections(['risk'], `&threshold=${threshold}`);
             }
+            renderRiskEngine(dashboardData.risk);
         } catch (err) {
             console.error('Failed to fetch risk analysis:', err);
             document.getElementById('risk-summary').innerHTML = '<p style="color: var(--danger-color); text-align: center;">Failed to load risk analysis.</p>';
@@ -775,13 +790,12 @@ document.addEventListener('DOMContentLoaded', () => {
         }
 
         try {
-            const response = await fetch(`/leave-simulator-week?username=${encodeURIComponent(currentUsername)}&password=${encodeURIComponent(currentPassword)}`);
-            const result = await response.json();
-            if (result.success) {
-                // If the render method exists, call it. Otherwise do nothing.
-                if (typeof renderWeekSimulation === 'function') {
-                    renderWeekSimulation(result.data);
-                }
+            if (!dashboardData.leave_week) {
+                await fetchSections(['leave_week']);
+            }
+            // If the render method exists, call it. Otherwise do nothing.
+            if (typeof renderWeekSimulation === 'function') {
+                renderWeekSimulation(dashboardData.leave_week);
             }
         } catch (err) {
             console.error('Failed to run week simulation:', err);
@@ -1093,16 +1107,12 @@ document.addEventListener('DOMContentLoaded', () => {
             bodyDiv.innerHTML = '<div style="text-align: center; padding: 2rem;"><i class="fa-solid fa-spinner fa-spin" style="font-size: 2rem; color: var(--accent-primary);"></i><p style="margin-top: 1rem; color: var(--text-secondary);">Loading absent dates...</p></div>';
 
             try {
-                const response = await fetch(`/absent-dates?username=${encodeURIComponent(currentUsername)}&password=${encodeURIComponent(currentPassword)}`);
-                const result = await response.json();
-                
-                if (result.success) {
-                    const grouping = document.getElementById('grouping-select') ? document.getElementById('grouping-select').value : 'day';
-                    const sortOrder = document.getElementById('sort-order-select') ? document.getElementById('sort-order-select').value : 'desc';
-                    renderAbsentDates(result.data, grouping, sortOrder);
-                } else {
-                    bodyDiv.innerHTML = '<p style="color: var(--danger-color); text-align: center;">Failed to load absent dates.</p>';
+                if (!dashboardData.absents) {
+                    await fetchSections(['absents']);
                 }
+                const grouping = document.getElementById('grouping-select') ? document.getElementById('grouping-select').value : 'day';
+                const sortOrder = document.getElementById('sort-order-select') ? document.getElementById('sort-order-select').value : 'desc';
+                renderAbsentDates(dashboardData.absents, grouping, sortOrder);
             } catch (err) {
                 console.error('Failed to fetch absent dates:', err);
                 bodyDiv.innerHTML = '<p style="color: var(--danger-color); text-align: center;">Network error occurred.</p>';
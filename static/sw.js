@@ -1,4 +1,4 @@
-const CACHE_NAME = 'lnct-attendance-cache-v1';
+const CACHE_NAME = 'lnct-attendance-cache-v2';
 const STATIC_ASSETS = [
     '/',
     '/static/index.html',
@@ -39,7 +39,8 @@ self.addEventListener('fetch', (event) => {
     const url = new URL(event.request.url);
 
     // Network-first strategy for API routes to always get fresh attendance data
-    if (url.pathname.startsWith('/attendance') ||
+    if (url.pathname.startsWith('/dashboard') ||
+        url.pathname.startsWith('/attendance') ||
         url.pathname.startsWith('/analysis') ||
         url.pathname.startsWith('/timetable') ||
         url.pathname.startsWith('/risk-engine') ||